@@ -25,6 +25,8 @@ from logging import getLogger
 import gtk
 import gtk.gdk as gdk
 
+from .trace import traced
+
 
 DRAG_TARGET_ITEM_LIST = ('x-etk-docking/item-list', gtk.TARGET_SAME_APP, 0)
 
@@ -132,14 +134,14 @@ class PlaceHolderWindow(gtk.Window):
         self._gc = None
         gtk.Window.do_unrealize(self)
 
+    @traced('PlaceHolderWindow.do_size_allocate')
     def do_size_allocate(self, allocation):
-        self.log.debug('%s' % allocation)
         gtk.Window.do_size_allocate(self, allocation)
 
         self._create_shape(allocation.width, allocation.height)
 
+    @traced('PlaceHolderWindow.do_expose_event')
     def do_expose_event(self, event):
-        self.log.debug('%s' % event)
         gtk.Window.do_expose_event(self, event)
 
         width, height = self.get_size()
@@ -158,8 +160,7 @@ class PlaceHolderWindow(gtk.Window):
     ############################################################################
     # EtkPlaceHolderWindow
     ############################################################################
+    @traced('PlaceHolderWindow.move_resize')
     def move_resize(self, x, y, width, height):
-        self.log.debug('%s, %s, %s, %s' % (x, y, width, height))
-
         self.move(x, y)
         self.resize(width, height)
@@ -25,6 +25,8 @@ from logging import getLogger
 import gtk
 import gtk.gdk as gdk
 
+from .dnd import Placeholder
+
 
 class DockFrame(gtk.Bin):
     '''
@@ -41,10 +43,25 @@ class DockFrame(gtk.Bin):
 
         # Internal housekeeping
         self._placeholder = None
+        self._placeholder_allocation = None
 
     ############################################################################
     # GtkWidget
     ############################################################################
+    def do_unmap(self):
+        self.hide_placeholder()
+        gtk.Bin.do_unmap(self)
+
+    def do_unrealize(self):
+        # The placeholder is not one of our children as far as forall() is
+        # concerned, so release it before our parent window goes away.
+        self.set_placeholder(None)
+        gtk.Bin.do_unrealize(self)
+
+    def do_hierarchy_changed(self, previous_toplevel):
+        # Reparenting between realized windows does not unrealize us
+        self.set_placeholder(None)
+
     def do_size_request(self, requisition):
         requisition.width = 0
         requisition.height = 0
@@ -79,7 +96,36 @@ class DockFrame(gtk.Bin):
             self._placeholder.unparent()
             self._placeholder.destroy()
             self._placeholder = None
+            self._placeholder_allocation = None
 
         if placeholder:
             self._placeholder = placeholder
             self._placeholder.set_parent(self)
+
+    def show_placeholder(self, allocation):
+        """
+        Show the frame's placeholder at allocation, a (x, y, width, height)
+        tuple. The placeholder is created once and reused, it is only
+        reallocated when allocation changes.
+        """
+        placeholder = self._placeholder
+
+        if not placeholder:
+            placeholder = Placeholder()
+            self.set_placeholder(placeholder)
+            placeholder.set_child_visible(False)
+            placeholder.show()
+
+        if allocation != self._placeholder_allocation:
+            placeholder.size_allocate(allocation)
+            self._placeholder_allocation = allocation
+
+        # Mapping the placeholder raises its window above the dock items
+        placeholder.set_child_visible(True)
+
+    def hide_placeholder(self):
+        """
+        Hide the frame's placeholder, keeping it around for the next drag.
+        """
+        if self._placeholder:
+            self._placeholder.set_child_visible(False)
@@ -22,7 +22,6 @@
 from __future__ import absolute_import
 from logging import getLogger
 from math import pi
-from operator import attrgetter
 from time import time
 
 import cairo
@@ -38,6 +37,10 @@ from .hslcolor import HslColor
 from .util import rect_contains
 
 
+# Number of seconds after which the widgets of a hidden tab are destroyed
+TAB_WIDGET_TIMEOUT = 30
+
+
 class _DockGroupTab(object):
     '''
     Convenience class storing information about a tab.
@@ -46,12 +49,15 @@ class _DockGroupTab(object):
                  'item_title_handler',  # item title property notification signal handler id
                  'item_title_tooltip_text_handler',
                                         # item title-tooltip-text property notification signal handler id
-                 'image',               # icon (gtk.Image)
-                 'label',               # title (gtk.Label)
-                 'button',              # close button (etk.docking.CompactButton)
-                 'menu_item',           # menu item (gtk.ImageMenuItem)
+                 'item_icon_name_handler',
+                                        # item icon-name property notification signal handler id
+                 'item_stock_handler',  # item stock property notification signal handler id
+                 'image',               # icon (gtk.Image) or None
+                 'label',               # title (gtk.Label) or None
+                 'button',              # close button (etk.docking.CompactButton) or None
                  'area',                # area, used for hit testing (gdk.Rectangle)
-                 'last_focused']        # timestamp set last time a tab was focused
+                 'metrics',             # cached (width, height, label width) or None
+                 'hidden_since']        # timestamp set when the tab was hidden, or None
 
     def __contains__(self, pos):
         return rect_contains(self.area, *pos)
@@ -75,6 +81,15 @@ class DockGroup(gtk.Container):
     etk.DockGroup.
     '''
     __gtype_name__ = 'EtkDockGroup'
+    __gproperties__ = \
+        {'tab-widget-timeout':
+             (gobject.TYPE_UINT,
+              'tab widget timeout',
+              'seconds after which the widgets of a hidden tab are destroyed',
+              0,
+              gobject.G_MAXINT,
+              TAB_WIDGET_TIMEOUT,
+              gobject.PARAM_READWRITE)}
     __gsignals__ = {'item-added':
                         (gobject.SIGNAL_RUN_LAST,
                          gobject.TYPE_NONE,
@@ -100,12 +115,25 @@ class DockGroup(gtk.Container):
         self._spacing = 3
         self._available_width = 0
         self._decoration_area = gdk.Rectangle()
+        self._tab_strip = None      # Off-screen rendering of frame and tabs
+        self._tab_strip_key = None
+        self._drawn_size = None     # Size and tabs we last queued a redraw for
+        self._drawn_current_tab = None
+        self._drawn_tabs = {}
 
         self._tabs = []
+        self._tab_map = {}          # Map item -> _DockGroupTab
+        self._tab_positions = {}    # Map item -> index in self._tabs
         self._visible_tabs = []
+        self._mru_tabs = []         # Tabs, most recently focused first
         self._current_tab = None
+        self._hover_tab = None      # Tab under the pointer
         self._tab_state = gtk.STATE_SELECTED
+        self._tab_button_size = 16
+        self._tab_widget_timeout = TAB_WIDGET_TIMEOUT
+        self._tab_widget_source = None
         self.dragcontext = DockDragContext()
+        self.connect('destroy', self._on_destroy)
 
         gtk.widget_push_composite_child()
         self._list_button = CompactButton('compact-list')
@@ -124,11 +152,23 @@ class DockGroup(gtk.Container):
         self._tab_menu.attach_to_widget(self, None)
         self._list_menu = gtk.Menu()
         self._list_menu.attach_to_widget(self._list_button, None)
+        self._list_menu_valid = True
         gtk.widget_pop_composite_child()
 
     def __len__(self):
         return len(self._tabs)
 
+    ############################################################################
+    # GObject
+    ############################################################################
+    def do_get_property(self, pspec):
+        if pspec.name == 'tab-widget-timeout':
+            return self.get_tab_widget_timeout()
+
+    def do_set_property(self, pspec, value):
+        if pspec.name == 'tab-widget-timeout':
+            self.set_tab_widget_timeout(value)
+
     ############################################################################
     # GtkWidget
     ############################################################################
@@ -143,6 +183,7 @@ class DockGroup(gtk.Container):
                                  window_type = gdk.WINDOW_CHILD,
                                  wclass = gdk.INPUT_OUTPUT,
                                  event_mask = (gdk.EXPOSURE_MASK |
+                                               gdk.LEAVE_NOTIFY_MASK |
                                                gdk.POINTER_MOTION_MASK |
                                                gdk.BUTTON_PRESS_MASK |
                                                gdk.BUTTON_RELEASE_MASK))
@@ -152,9 +193,11 @@ class DockGroup(gtk.Container):
 
         # Set parent window on all child widgets
         for tab in self._tabs:
-            tab.image.set_parent_window(self.window)
-            tab.label.set_parent_window(self.window)
-            tab.button.set_parent_window(self.window)
+            if tab.image is not None:
+                tab.image.set_parent_window(self.window)
+                tab.label.set_parent_window(self.window)
+                tab.button.set_parent_window(self.window)
+
             tab.item.set_parent_window(self.window)
 
         self._list_button.set_parent_window(self.window)
@@ -162,6 +205,9 @@ class DockGroup(gtk.Container):
         self._max_button.set_parent_window(self.window)
 
     def do_unrealize(self):
+        self._cancel_tab_widget_sweep()
+        self._tab_strip = None
+        self._tab_strip_key = None
         self.window.set_user_data(None)
         self.window.destroy()
         gtk.Container.do_unrealize(self)
@@ -180,6 +226,14 @@ class DockGroup(gtk.Container):
         self.window.hide()
         gtk.Container.do_unmap(self)
 
+    def do_focus(self, direction):
+        # Items of other tabs are shown but not child-visible, keep them
+        # out of the focus chain.
+        if self._current_tab:
+            return self._current_tab.item.child_focus(direction)
+
+        return False
+
     def do_size_request(self, requisition):
         gtk.Container.do_size_request(self, requisition)
 
@@ -190,17 +244,13 @@ class DockGroup(gtk.Container):
         # current item tab size to the decoration area requisition as
         # the other tabs can be hidden when we don't get enough room
         # in the allocation fase.
+        # Tab geometry is measured once and cached on the tab, until the
+        # title, icon or style changes (see _invalidate_tab_metrics()).
         for tab in self._tabs:
-            (iw, ih) = tab.image.size_request()
-            (lw, lh) = tab.label.size_request()
-            (bw, bh) = tab.button.size_request()
+            if tab.metrics is None:
+                tab.metrics = self._measure_tab(tab)
 
-            tab.area.width = (self._frame_width + self._spacing +
-                              iw + self._spacing + lw + self._spacing +
-                              bw + self._spacing + self._frame_width)
-            tab.area.height = (self._frame_width + self._spacing +
-                               max(ih, lh, bh) +
-                               self._spacing + self._frame_width)
+            (tab.area.width, tab.area.height, lw) = tab.metrics
 
             if tab == self._current_tab:
                 dw = tab.area.width - lw
@@ -258,21 +308,31 @@ class DockGroup(gtk.Container):
         self._update_visible_tabs()
 
         # Update visibility on dockitems and composite children used by tabs.
+        visible_tabs = set(self._visible_tabs)
+
+        # Items of other tabs are kept shown but not child-visible, so
+        # switching tabs does not need to resize our ancestors.
         for tab in self._tabs:
             if tab is self._current_tab:
                 tab.item.show()
+                tab.item.set_child_visible(True)
                 tab.image.show()
                 tab.label.show()
                 tab.button.show()
-            elif tab in self._visible_tabs:
-                tab.item.hide()
+            elif tab in visible_tabs:
+                if tab.item.get_child_visible():
+                    tab.item.set_child_visible(False)
+
                 tab.image.show()
                 tab.label.show()
-            elif tab.item.flags() & gtk.VISIBLE:
-                tab.item.hide()
-                tab.image.hide()
-                tab.label.hide()
-                tab.button.hide()
+            else:
+                if tab.item.get_child_visible():
+                    tab.item.set_child_visible(False)
+
+                if tab.image is not None:
+                    tab.image.hide()
+                    tab.label.hide()
+                    tab.button.hide()
 
         # Only show the list button when needed
         if len(self._tabs) > len(self._visible_tabs):
@@ -315,17 +375,69 @@ class DockGroup(gtk.Container):
 
         # Allocate space for the current *item*
         if self._current_tab:
-            ix = self._frame_width + self.border_width
-            iy = self._decoration_area.height + self.border_width
-            iw = max(allocation.width - (2 * self._frame_width) - (2 * self.border_width), 0)
-            ih = max(allocation.height - (2 * self._frame_width) - (2 * self.border_width) - 23, 0)
-            self._current_tab.item.size_allocate(gdk.Rectangle(ix, iy, iw, ih))
+            self._allocate_current_item()
 
         #assert not self._current_tab or self._current_tab in self._visible_tabs
-        self.queue_draw_area(0, 0, self.allocation.width, self.allocation.height)
+        self._queue_draw_changes()
 
     def do_expose_event(self, event):
-        # Prepare colors
+        a = self.allocation
+
+        try:
+            # Fails if expose event happens before size request/allocate when a new
+            # current_tab has been selected.
+            visible_index = self._visible_tabs.index(self._current_tab)
+        except ValueError:
+            visible_index = -1
+
+        # Create cairo context
+        c = self.window.cairo_create()
+
+        # The decoration area is rendered once into an off-screen surface
+        # and redrawn only when its geometry, the current tab or style changes.
+        dh = self._decoration_area.height
+        key = (a.width, dh,
+               tuple(tuple(tab.area) for tab in self._visible_tabs),
+               visible_index, self.style, self.state, self._tab_state)
+
+        if key != self._tab_strip_key:
+            self._tab_strip = c.get_target().create_similar(cairo.CONTENT_COLOR,
+                                                            max(a.width, 1),
+                                                            max(dh, 1))
+            self._draw_tab_strip(cairo.Context(self._tab_strip), visible_index)
+            self._tab_strip_key = key
+
+        # Restrict context to the exposed area, avoid extra work
+        c.rectangle(event.area.x, event.area.y, event.area.width, event.area.height)
+        c.clip()
+
+        if event.area.y < dh:
+            c.save()
+            c.rectangle(0, 0, a.width, dh)
+            c.clip()
+            c.set_source_surface(self._tab_strip, 0, 0)
+            c.paint()
+            c.restore()
+
+        if event.area.y + event.area.height > dh:
+            self._draw_content_area(c)
+
+        if visible_index >= 0:
+            self.propagate_expose(self._current_tab.item, event)
+
+        for tab in self._visible_tabs:
+            self.propagate_expose(tab.image, event)
+            self.propagate_expose(tab.label, event)
+            self.propagate_expose(tab.button, event)
+
+        self.propagate_expose(self._list_button, event)
+        self.propagate_expose(self._min_button, event)
+        self.propagate_expose(self._max_button, event)
+
+        return False
+
+    def _get_colors(self):
+        # Return (bg, dark, tab_light, tab_dark) as rgb float tuples
         bg = self.style.bg[self.state]
         bg = (bg.red_float, bg.green_float, bg.blue_float)
         dark = self.style.dark[self.state]
@@ -335,26 +447,26 @@ class DockGroup(gtk.Container):
         tab_dark = HslColor(self.style.text_aa[gtk.STATE_SELECTED])
         tab_dark.set_l(0.9)
         tab_dark = tab_dark.get_rgb_float()
+        return (bg, dark, tab_light, tab_dark)
 
-        # Create cairo context
-        c = self.window.cairo_create()
-
-        # Restrict context to the exposed area, avoid extra work
-        c.rectangle(event.area.x, event.area.y, event.area.width, event.area.height)
-        c.clip_preserve()
+    def _draw_content_area(self, c):
+        # Draw the background, frame and border below the decoration area.
+        # This is cheap, so it is not cached like the tab strip.
+        (bg, dark, tab_light, tab_dark) = self._get_colors()
+        a = self.allocation
+        dh = self._decoration_area.height
 
         # Draw background
+        c.rectangle(0, dh, a.width, a.height - dh)
         c.set_source_rgb(*bg)
         c.fill()
 
         # Draw frame
-        a = self.allocation
         c.set_line_width(self._frame_width)
-        c.rectangle(0.5, 0.5, a.width - 1, a.height - 1)
-        c.set_source_rgb(*dark)
-        c.stroke()
-        c.move_to(0.5, self._decoration_area.height - 0.5)
-        c.line_to(a.width + 0.5, self._decoration_area.height - 0.5)
+        c.move_to(0.5, dh)
+        c.line_to(0.5, a.height - 0.5)
+        c.line_to(a.width - 0.5, a.height - 0.5)
+        c.line_to(a.width - 0.5, dh)
         c.set_source_rgb(*dark)
         c.stroke()
 
@@ -362,22 +474,39 @@ class DockGroup(gtk.Container):
             # Draw border
             c.set_line_width(self.border_width)
             c.rectangle(self._frame_width + self.border_width / 2,
-                        self._decoration_area.height + self.border_width / 2,
+                        dh + self.border_width / 2,
                         a.width - (2 * self._frame_width) - self.border_width,
-                        a.height - self._decoration_area.height - self._frame_width - self.border_width)
+                        a.height - dh - self._frame_width - self.border_width)
             c.set_source_rgb(*tab_light)
             c.stroke()
 
+    def _draw_tab_strip(self, c, visible_index):
+        # Draw the decoration area: tabs and the top of the frame
+        (bg, dark, tab_light, tab_dark) = self._get_colors()
+        a = self.allocation
+        dh = self._decoration_area.height
+
+        # Draw background
+        c.set_source_rgb(*bg)
+        c.paint()
+
+        # Draw frame
+        c.set_line_width(self._frame_width)
+        c.move_to(0.5, dh)
+        c.line_to(0.5, 0.5)
+        c.line_to(a.width - 0.5, 0.5)
+        c.line_to(a.width - 0.5, dh)
+        c.set_source_rgb(*dark)
+        c.stroke()
+        c.move_to(0.5, dh - 0.5)
+        c.line_to(a.width + 0.5, dh - 0.5)
+        c.set_source_rgb(*dark)
+        c.stroke()
+
+        if self._visible_tabs:
             # Draw tabs
             c.set_line_width(self._frame_width)
 
-            try:
-                # Fails if expose event happens before size request/allocate when a new
-                # current_tab has been selected.
-                visible_index = self._visible_tabs.index(self._current_tab)
-            except ValueError:
-                visible_index = -1
-
             for index, tab in enumerate(self._visible_tabs):
                 tx = tab.area.x
                 ty = tab.area.y
@@ -416,17 +545,15 @@ class DockGroup(gtk.Container):
                     c.set_source_rgb(*dark)
                     c.stroke()
 
-                    self.propagate_expose(self._current_tab.item, event)
+    def do_style_set(self, previous_style):
+        gtk.Container.do_style_set(self, previous_style)
 
-                self.propagate_expose(tab.image, event)
-                self.propagate_expose(tab.label, event)
-                self.propagate_expose(tab.button, event)
+        # Fonts, colors and icon sizes may have changed, measure
+        # and draw all tabs again
+        self._tab_strip_key = None
 
-        self.propagate_expose(self._list_button, event)
-        self.propagate_expose(self._min_button, event)
-        self.propagate_expose(self._max_button, event)
-
-        return False
+        for tab in self._tabs:
+            self._invalidate_tab_metrics(tab)
 
     def do_button_press_event(self, event):
         '''
@@ -465,7 +592,7 @@ class DockGroup(gtk.Container):
         if clicked_tab:
             # Set the current item on left click
             if event.button == 1:
-                self.set_current_item(self._tabs.index(clicked_tab))
+                self.set_current_item(self.item_num(clicked_tab.item))
             # Show context menu on right click
             elif event.button == 3:
                 #TODO: implement tab context menu
@@ -494,12 +621,11 @@ class DockGroup(gtk.Container):
         pointer moves while over this widget.
         '''
 
-        # Reset tooltip text
-        self.set_tooltip_text(None)
-
         # We should not react to motion_notify_events originating from the
         # current tab's child widget
-        if event.window is self.window:
+        if event.window is not self.window:
+            self._set_hover_tab(None)
+        else:
             # Check if we are actually starting a DnD operation
             if event.state & gdk.BUTTON1_MASK and \
                self.dragcontext.source_button == 1 and \
@@ -522,18 +648,16 @@ class DockGroup(gtk.Container):
                     self.drag_begin([DRAG_TARGET_ITEM_LIST], gdk.ACTION_MOVE,
                                     self.dragcontext.source_button, event)
 
-            # Update tab button visibility
-            for tab in self._visible_tabs:
-                if (event.x, event.y) in tab:
-                    # Update tooltip for tab under the cursor
-                    self.set_tooltip_text(tab.item.get_title_tooltip_text())
-
-                    tab.button.show()
-                else:
-                    tab.button.hide()
+            # Update tab button visibility and tooltip, but only when the
+            # pointer moved onto another tab
+            if not (self._hover_tab and (event.x, event.y) in self._hover_tab):
+                self._set_hover_tab(self.get_tab_at_pos(event.x, event.y))
 
         return True
 
+    def do_leave_notify_event(self, event):
+        self._set_hover_tab(None)
+
     ############################################################################
     # GtkWidget drag source
     ############################################################################
@@ -546,10 +670,9 @@ class DockGroup(gtk.Container):
         handler is to set up a custom drag icon with the drag_source_set_icon()
         method.
         '''
-        # Free the item for transport.
-        for item in self.dragcontext.dragged_object:
-            self._dragged_tab_index = [t.item for t in self._tabs].index(item)
-            self.remove_item(self._dragged_tab_index)
+        # Free the items for transport.
+        self._dragged_tab_index = min(self.item_num(item) for item in self.dragcontext.dragged_object)
+        self.remove_items(self.dragcontext.dragged_object)
 
         #TODO: Set drag icon to be empty
         #TODO: Set drag cursor -> will most likely not (only) happen here...
@@ -620,9 +743,8 @@ class DockGroup(gtk.Container):
         again, if not attached to some other widget already.
         '''
         if self.dragcontext.dragging and self.dragcontext.dragged_object:
-            for item in self.dragcontext.dragged_object:
-                if not item.get_parent():
-                    self.insert_item(item)
+            self.insert_items([item for item in self.dragcontext.dragged_object
+                               if not item.get_parent()])
 
         self.dragcontext.reset()
         self.queue_resize()
@@ -634,9 +756,10 @@ class DockGroup(gtk.Container):
         # Internal widgets
         if internals:
             for tab in self._tabs:
-                callback(tab.image, data)
-                callback(tab.label, data)
-                callback(tab.button, data)
+                if tab.image is not None:
+                    callback(tab.image, data)
+                    callback(tab.label, data)
+                    callback(tab.button, data)
 
             callback(self._list_button, data)
             callback(self._min_button, data)
@@ -647,36 +770,25 @@ class DockGroup(gtk.Container):
             callback(tab.item, data)
 
     def do_add(self, widget):
-        if widget not in (tab.item for tab in self._tabs):
+        if widget not in self._tab_map:
             self._insert_item(widget)
 
     def do_remove(self, widget):
         self._remove_item(widget)
 
     def _remove_item(self, child):
-        assert child in (tab.item for tab in self._tabs)
+        assert child in self._tab_map
 
         item_num = self.item_num(child)
         tab = self._tabs[item_num]
 
         # We need this to reset the current item below
-        old_tab_index = self._tabs.index(self._current_tab)
-
-        # Remove tab item
-        tab.item.disconnect(tab.item_title_handler)
-        tab.item.disconnect(tab.item_title_tooltip_text_handler)
-        tab.item.unparent()
+        old_tab_index = self.get_current_item()
 
-        # Remove child widgets
-        tab.image.unparent()
-        tab.image.destroy()
-        tab.label.unparent()
-        tab.label.destroy()
-        tab.button.unparent()
-        tab.button.destroy()
-        self._list_menu.remove(tab.menu_item)
-        tab.menu_item.destroy()
-        self._tabs.remove(tab)
+        self._remove_tab(tab)
+        del self._tabs[item_num]
+        self._reindex_tabs(item_num)
+        self._mru_tabs.remove(tab)
 
         # Refresh ourselves
         current_tab_index = old_tab_index
@@ -684,9 +796,41 @@ class DockGroup(gtk.Container):
         if item_num < current_tab_index:
             item_num = current_tab_index - 1
 
-        self.set_current_item(item_num)
+        self._select_item(item_num)
+        self.queue_resize()
         self.emit('item-removed', child)
 
+    def _remove_tab(self, tab):
+        '''
+        Detach the item of tab and destroy the tab widgets. Removing the tab
+        from the tab lists and updating the current item is left to the caller.
+        '''
+        # Remove tab item
+        tab.item.disconnect(tab.item_title_handler)
+        tab.item.disconnect(tab.item_title_tooltip_text_handler)
+        tab.item.disconnect(tab.item_icon_name_handler)
+        tab.item.disconnect(tab.item_stock_handler)
+        tab.item.unparent()
+
+        if tab is self._hover_tab:
+            self._hover_tab = None
+
+        if tab in self._visible_tabs:
+            self._visible_tabs.remove(tab)
+
+        drawn_state = self._drawn_tabs.pop(tab, None)
+
+        if drawn_state:
+            self.queue_draw_area(*drawn_state[:4])
+
+        # Remove child widgets
+        if tab.image is not None:
+            self._destroy_tab_widgets(tab)
+
+        self._list_menu_valid = False
+        del self._tab_map[tab.item]
+        del self._tab_positions[tab.item]
+
     ############################################################################
     # EtkDockGroup
     ############################################################################
@@ -695,54 +839,32 @@ class DockGroup(gtk.Container):
     visible_items = property(lambda s: [t.item for t in s._visible_tabs])
 
     def __contains__(self, item):
-        return item in self.items
+        return item in self._tab_map
+
+    def _reindex_tabs(self, start=0):
+        '''
+        Update the item to position map for all tabs starting at the index
+        specified by start.
+        '''
+        positions = self._tab_positions
+
+        for index in xrange(start, len(self._tabs)):
+            positions[self._tabs[index].item] = index
 
     def _update_visible_tabs(self):
         # Check what tabs we can show with the space we have been allocated.
-        # Tabs on the far right of the current item tab get hidden first,
-        # then tabs on the far left.
+        # The most recently focused tabs are shown first, so the current
+        # item's tab is always visible. Tabs that were visible before keep
+        # their position, newly visible tabs are added at the end.
         if not self._tabs:
             del self._visible_tabs[:]
         else:
-            # TODO: get previous tab position, use that to insert _current_tab
-            if self._current_tab and self._current_tab not in self._visible_tabs:
-                self._visible_tabs.append(self._current_tab)
-
-            #if not set(self._visible_tabs) <= set(self._tabs):
-            for tab in self._visible_tabs:
-                if tab not in self._tabs:
-                    self._visible_tabs.remove(tab)
-
-                # TODO: There are other places where something like this happens,
-                #       notably do_motion_notify_event. Consider some cleanup...
-                if tab is self._current_tab:
-                    tab.button.show()
-                else:
-                    tab.button.hide()
-
             available_width = self._available_width
-            calculated_width = 0
-
-            for tab in self._visible_tabs:
-                calculated_width += tab.area.width
-
-            if calculated_width < available_width and len(self._visible_tabs) < len(self._tabs):
-                tab_age = sorted(self._tabs, key=attrgetter('last_focused'), reverse=True)
-
-                while tab_age and calculated_width < available_width:
-                    if tab_age[0] not in self._visible_tabs:
-                        calculated_width += tab_age[0].area.width
-                        self._visible_tabs.append(tab_age[0])
 
-                    del tab_age[0]
-
-            if calculated_width > available_width:
-                tab_age = sorted(self._visible_tabs, key=attrgetter('last_focused'))
-
-                while len(tab_age) > 1 and calculated_width > available_width:
-                    calculated_width -= tab_age[0].area.width
-                    self._visible_tabs.remove(tab_age[0])
-                    del tab_age[0]
+            # Newly visible tabs may need a little more or less room than
+            # estimated, fit the tabs again with the corrected metrics.
+            while self._fit_visible_tabs(available_width):
+                pass
 
             # If the current item's tab is the only visible tab,
             # we need to recalculate its tab.area.width
@@ -760,6 +882,164 @@ class DockGroup(gtk.Container):
                 else:
                     self._current_tab.area.width = normal
 
+    def _fit_visible_tabs(self, available_width):
+        '''
+        Select the tabs that fit in available_width and create widgets for
+        newly visible tabs. Returns True if the metrics of a newly visible
+        tab had to be corrected, in which case the tabs should be fitted again.
+        '''
+        calculated_width = 0
+        fitting_tabs = set()
+
+        for tab in self._mru_tabs:
+            if fitting_tabs and calculated_width + tab.area.width > available_width:
+                break
+
+            calculated_width += tab.area.width
+            fitting_tabs.add(tab)
+
+        visible_tabs = []
+        hidden_tabs = False
+        now = time()
+
+        for tab in self._visible_tabs:
+            if tab in fitting_tabs:
+                visible_tabs.append(tab)
+            elif tab.image is not None:
+                tab.hidden_since = now
+                hidden_tabs = True
+
+        fitting_tabs.difference_update(visible_tabs)
+        visible_tabs.extend(tab for tab in self._mru_tabs if tab in fitting_tabs)
+        self._visible_tabs[:] = visible_tabs
+
+        # Tab widgets are only created once a tab becomes visible, and
+        # destroyed again when it stays hidden for a while.
+        if hidden_tabs:
+            self._schedule_tab_widget_sweep()
+
+        if self._hover_tab not in self._visible_tabs:
+            self._hover_tab = None
+
+        # TODO: There are other places where something like this happens,
+        #       notably _set_hover_tab. Consider some cleanup...
+        corrected = False
+
+        for tab in self._visible_tabs:
+            tab.hidden_since = None
+
+            if tab.image is None:
+                corrected = self._create_tab_widgets(tab) or corrected
+
+            if tab is self._current_tab or tab is self._hover_tab:
+                tab.button.show()
+            else:
+                tab.button.hide()
+
+        return corrected
+
+    def _queue_draw_changes(self):
+        # Invalidate what changed since the last call: everything when our
+        # size changed, otherwise the tabs whose area or position relative
+        # to the current tab changed and the content area when the current
+        # tab changed.
+        a = self.allocation
+        size = (a.width, a.height, self._decoration_area.height)
+
+        if size != self._drawn_size:
+            self.queue_draw_area(0, 0, a.width, a.height)
+            self._drawn_size = size
+        elif self._current_tab is not self._drawn_current_tab:
+            self.queue_draw_area(0, self._decoration_area.height,
+                                 a.width, a.height - self._decoration_area.height)
+
+        self._drawn_current_tab = self._current_tab
+
+        try:
+            visible_index = self._visible_tabs.index(self._current_tab)
+        except ValueError:
+            visible_index = -1
+
+        drawn_tabs = {}
+
+        for index, tab in enumerate(self._visible_tabs):
+            state = (tab.area.x, tab.area.y, tab.area.width, tab.area.height,
+                     cmp(index, visible_index))
+            old_state = self._drawn_tabs.pop(tab, None)
+
+            if state != old_state:
+                self.queue_draw_area(*state[:4])
+
+                if old_state:
+                    self.queue_draw_area(*old_state[:4])
+
+            drawn_tabs[tab] = state
+
+        # Tabs that are no longer visible
+        for old_state in self._drawn_tabs.itervalues():
+            self.queue_draw_area(*old_state[:4])
+
+        self._drawn_tabs = drawn_tabs
+
+    def _queue_draw_border(self):
+        # Invalidate the border drawn around the content area
+        a = self.allocation
+        y = self._decoration_area.height
+        t = self._frame_width + self.border_width
+        self.queue_draw_area(0, y, a.width, t)
+        self.queue_draw_area(0, a.height - t, a.width, t)
+        self.queue_draw_area(0, y, t, a.height - y)
+        self.queue_draw_area(a.width - t, y, t, a.height - y)
+
+    def _allocate_current_item(self):
+        allocation = self.allocation
+        ix = self._frame_width + self.border_width
+        iy = self._decoration_area.height + self.border_width
+        iw = max(allocation.width - (2 * self._frame_width) - (2 * self.border_width), 0)
+        ih = max(allocation.height - (2 * self._frame_width) - (2 * self.border_width) - 23, 0)
+        self._current_tab.item.size_allocate(gdk.Rectangle(ix, iy, iw, ih))
+
+    def _can_switch_tab(self, old_tab, new_tab):
+        # Switching between two visible tabs leaves the visible tabs as they
+        # are. Our size requisition stays the same as long as the decoration
+        # around the label and the height requested by the item are the same.
+        if not (old_tab.metrics and new_tab.metrics and
+                old_tab in self._visible_tabs and new_tab in self._visible_tabs and
+                new_tab.item.flags() & gtk.VISIBLE):
+            return False
+
+        return (old_tab.metrics[0] - old_tab.metrics[2] == new_tab.metrics[0] - new_tab.metrics[2] and
+                old_tab.item.get_child_requisition()[1] == new_tab.item.size_request()[1])
+
+    def _switch_tab(self, old_tab):
+        # Swap the visible item and tab close buttons without a relayout
+        old_tab.item.set_child_visible(False)
+        self._current_tab.item.set_child_visible(True)
+        self._allocate_current_item()
+
+        if old_tab is not self._hover_tab:
+            old_tab.button.hide()
+
+        self._current_tab.button.show()
+        self._queue_draw_changes()
+
+    def _set_hover_tab(self, tab):
+        # Show the close button and tooltip of the tab under the pointer
+        if tab is self._hover_tab:
+            return
+
+        old_tab = self._hover_tab
+        self._hover_tab = tab
+
+        if old_tab and old_tab is not self._current_tab and old_tab.button is not None:
+            old_tab.button.hide()
+
+        if tab:
+            tab.button.show()
+            self.set_tooltip_text(tab.item.get_title_tooltip_text())
+        else:
+            self.set_tooltip_text(None)
+
     def set_tab_state(self, tab_state):
         '''
         Define the tab state. Normally that will be ``gtk.STATE_SELECTED``, but a
@@ -767,8 +1047,12 @@ class DockGroup(gtk.Container):
         '''
         self._tab_state = tab_state
 
+        # Only the content area border and the current tab use the tab state
         if self.allocation:
-            self.queue_draw_area(0, 0, self.allocation.width, self.allocation.height)
+            self._queue_draw_border()
+
+            if self._current_tab in self._drawn_tabs:
+                self.queue_draw_area(*self._current_tab.area)
 
     def get_tab_state(self):
         '''
@@ -776,6 +1060,25 @@ class DockGroup(gtk.Container):
         '''
         return self._tab_state
 
+    def get_tab_widget_timeout(self):
+        '''
+        :returns: the number of seconds after which the widgets of a hidden
+                  tab are destroyed.
+        '''
+        return self._tab_widget_timeout
+
+    def set_tab_widget_timeout(self, timeout):
+        '''
+        :param timeout: the number of seconds after which the widgets of a
+                        hidden tab are destroyed.
+
+        Tab widgets (icon, title and close button) are only created for visible
+        tabs. Once a tab has been hidden for the number of seconds specified by
+        timeout, its widgets are destroyed again.
+        '''
+        self._tab_widget_timeout = timeout
+        self.notify('tab-widget-timeout')
+
     def get_tab_at_pos(self, x, y):
         '''
         :param x: the x coordinate of the position
@@ -831,58 +1134,201 @@ class DockGroup(gtk.Container):
         index = self._insert_item(item, position, visible_position)
         return index
 
+    def insert_items(self, items, position=None, visible_position=None):
+        '''
+        :param items: a list of DockItems
+        :param position: the index (starting at 0) at which to insert the first
+                         item, or None to append the items after all other
+                         item tabs.
+        :param visible_position: the index at which the first of the newly
+                         inserted items should be displayed, see insert_item().
+        :returns: a list with the index numbers of the item tabs in the DockGroup
+
+        The insert_items() method inserts several DockItems into the DockGroup
+        at once, starting at the location specified by position. The last
+        inserted item becomes the current item. The DockGroup is resized once,
+        and the item-added signal is emitted for each item after all items
+        have been inserted.
+        '''
+        if position is None or position < 0 or position > len(self):
+            position = len(self)
+
+        for offset, item in enumerate(items):
+            if visible_position is not None:
+                self._add_tab(item, position + offset, visible_position + offset, reindex=False)
+            else:
+                self._add_tab(item, position + offset, reindex=False)
+
+        self._reindex_tabs(position)
+
+        for item in items:
+            self.emit('item-added', item)
+
+        if items:
+            self._select_item(position + len(items) - 1)
+            self.queue_resize()
+
+        return range(position, position + len(items))
+
     def _insert_item(self, item, position=None, visible_position=None):
+        if position is None or position < 0 or position > len(self):
+            position = len(self)
+
+        self._add_tab(item, position, visible_position)
+        self.emit('item-added', item)
+
+        item_num = self.item_num(item)
+        self._select_item(item_num)
+        self.queue_resize()
+
+        return item_num
+
+    def _add_tab(self, item, position, visible_position=None, reindex=True):
+        '''
+        Create a tab for item and insert it at position. Emitting the
+        item-added signal and updating the current item is left to the caller,
+        as is reindexing the tabs when reindex is False.
+        '''
         assert isinstance(item, DockItem)
         assert self.item_num(item) is None
 
-        if position is None or position < 0:
-            position = len(self)
-
-        # Create composite children for tab
-        gtk.widget_push_composite_child()
+        # Tab widgets are created when the tab becomes visible,
+        # see _update_visible_tabs()
         tab = _DockGroupTab()
-        tab.image = item.get_image()
-        tab.label = gtk.Label()
-        tab.button = CompactButton(has_frame=False)
-        tab.menu_item = gtk.ImageMenuItem()
-        gtk.widget_pop_composite_child()
+        tab.image = tab.label = tab.button = None
 
         # Configure child widgets for tab
         tab.item = item
         tab.item.set_parent(self)
         tab.item_title_handler = tab.item.connect('notify::title', self._on_item_title_changed, tab)
         tab.item_title_tooltip_text_handler = tab.item.connect('notify::title-tooltip-text', self._on_item_title_tooltip_text_changed, tab)
+        tab.item_icon_name_handler = tab.item.connect('notify::icon-name', self._on_item_image_changed, tab)
+        tab.item_stock_handler = tab.item.connect('notify::stock', self._on_item_image_changed, tab)
+        tab.area = gdk.Rectangle()
+        tab.metrics = None
+        tab.hidden_since = None
+
+        if self.flags() & gtk.REALIZED:
+            tab.item.set_parent_window(self.window)
+
+        self._tabs.insert(position, tab)
+        self._tab_map[item] = tab
+        self._list_menu_valid = False
+        self._mru_tabs.insert(0, tab)
+
+        if reindex:
+            self._reindex_tabs(position)
+
+        #TODO: get rid of this pronto!
+        if visible_position is not None:
+            self._create_tab_widgets(tab)
+            self._visible_tabs.insert(visible_position, tab)
+
+        return tab
+
+    def _create_tab_widgets(self, tab):
+        '''
+        Create the composite children showing tab in the tab strip. Returns
+        True if the tab's metrics had to be corrected.
+        '''
+        gtk.widget_push_composite_child()
+        tab.image = tab.item.get_image()
+        tab.label = gtk.Label()
+        tab.button = CompactButton(size=self._tab_button_size, has_frame=False)
+        gtk.widget_pop_composite_child()
+
         tab.image.set_parent(self)
-        tab.label.set_text(item.get_title())
+        tab.label.set_text(tab.item.get_title())
         tab.label.set_parent(self)
         tab.button.set_icon_name_normal('compact-close')
         tab.button.set_icon_name_prelight('compact-close-prelight')
         tab.button.set_parent(self)
-        tab.button.connect('clicked', self._on_tab_button_clicked, item)
-        tab.menu_item.set_image(item.get_image())
-        tab.menu_item.set_label(item.get_title())
-        tab.menu_item.connect('activate', self._on_list_menu_item_activated, tab)
-        self._list_menu.append(tab.menu_item)
-        tab.area = gdk.Rectangle()
-        tab.last_focused = time()
+        tab.button.connect('clicked', self._on_tab_button_clicked, tab.item)
 
         if self.flags() & gtk.REALIZED:
-            tab.item.set_parent_window(self.window)
             tab.image.set_parent_window(self.window)
             tab.label.set_parent_window(self.window)
             tab.button.set_parent_window(self.window)
 
-        self._tabs.insert(position, tab)
-        self.emit('item-added', item)
+        # The widgets may need a little more or less room than estimated.
+        # Showing the new widgets queues a resize, so our size request picks
+        # up the corrected metrics as well.
+        metrics = self._measure_tab(tab)
 
-        #TODO: get rid of this pronto!
-        if visible_position is not None:
-            self._visible_tabs.insert(visible_position, tab)
+        if metrics == tab.metrics:
+            return False
 
-        item_num = self.item_num(item)
-        self.set_current_item(item_num)
+        tab.metrics = metrics
+        (tab.area.width, tab.area.height, lw) = metrics
+        return True
 
-        return item_num
+    def _destroy_tab_widgets(self, tab):
+        '''
+        Destroy the composite children created by _create_tab_widgets().
+        '''
+        for widget in (tab.image, tab.label, tab.button):
+            widget.unparent()
+            widget.destroy()
+
+        tab.image = tab.label = tab.button = None
+
+    def _measure_tab(self, tab):
+        '''
+        Return (width, height, label width) of tab. Tabs without widgets are
+        measured from the item's title and icon.
+        '''
+        if tab.image is not None:
+            (iw, ih) = tab.image.size_request()
+            (lw, lh) = tab.label.size_request()
+            (bw, bh) = tab.button.size_request()
+        else:
+            if tab.item.get_icon_name() or tab.item.get_stock():
+                (iw, ih) = gtk.icon_size_lookup(gtk.ICON_SIZE_MENU)
+            else:
+                iw = ih = 0
+
+            (lw, lh) = self.create_pango_layout(tab.item.get_title() or '').get_pixel_size()
+            bw = bh = self._tab_button_size
+
+        return ((self._frame_width + self._spacing +
+                 iw + self._spacing + lw + self._spacing +
+                 bw + self._spacing + self._frame_width),
+                (self._frame_width + self._spacing +
+                 max(ih, lh, bh) +
+                 self._spacing + self._frame_width),
+                lw)
+
+    def _schedule_tab_widget_sweep(self):
+        if self._tab_widget_source is None:
+            self._tab_widget_source = gobject.timeout_add_seconds(max(self._tab_widget_timeout, 1),
+                                                                  self._on_tab_widget_timeout)
+
+    def _cancel_tab_widget_sweep(self):
+        if self._tab_widget_source is not None:
+            gobject.source_remove(self._tab_widget_source)
+            self._tab_widget_source = None
+
+    def _on_tab_widget_timeout(self):
+        # Destroy widgets of tabs that have been hidden long enough,
+        # keep the timeout running while other hidden tabs still have widgets.
+        deadline = time() - self._tab_widget_timeout
+        pending = False
+
+        for tab in self._tabs:
+            if tab.hidden_since is not None and tab.image is not None:
+                if tab.hidden_since <= deadline:
+                    self._destroy_tab_widgets(tab)
+                    tab.hidden_since = None
+                else:
+                    pending = True
+
+        if not pending:
+            self._tab_widget_source = None
+
+        return pending
+
+    def _on_destroy(self, widget):
+        self._cancel_tab_widget_sweep()
 
     def remove_item(self, item_num):
         '''
@@ -900,6 +1346,41 @@ class DockGroup(gtk.Container):
 
         self._remove_item(item)
 
+    def remove_items(self, items):
+        '''
+        :param items: a list of DockItems in the DockGroup
+
+        The remove_items() method removes several DockItems from the DockGroup
+        at once. The DockGroup is resized once, and the item-removed signal is
+        emitted for each item after all items have been removed.
+        '''
+        if not items:
+            return
+
+        assert all(item in self._tab_map for item in items)
+
+        removed_tabs = set(self._tab_map[item] for item in items)
+        first_item_num = min(self.item_num(item) for item in items)
+
+        for tab in removed_tabs:
+            self._remove_tab(tab)
+
+        self._tabs[:] = [tab for tab in self._tabs if tab not in removed_tabs]
+        self._mru_tabs[:] = [tab for tab in self._mru_tabs if tab not in removed_tabs]
+        self._reindex_tabs(first_item_num)
+
+        # Keep the current item, or select the item following the first
+        # removed item.
+        if self._current_tab in removed_tabs:
+            self._select_item(first_item_num)
+        else:
+            self._select_item(self.get_current_item())
+
+        self.queue_resize()
+
+        for item in items:
+            self.emit('item-removed', item)
+
     def item_num(self, item):
         '''
         :param item: a DockItem
@@ -909,10 +1390,7 @@ class DockGroup(gtk.Container):
         The item_num() method returns the index of the item tab which contains
         the DockItem specified by item or None if no item tab contains item.
         '''
-        for tab in self._tabs:
-            if tab.item is item:
-                return self._tabs.index(tab)
-        return None
+        return self._tab_positions.get(item)
 
     def get_n_items(self):
         '''
@@ -947,7 +1425,7 @@ class DockGroup(gtk.Container):
         numbered from 0, or None if there are no item tabs.
         '''
         if self._current_tab:
-            return self._tabs.index(self._current_tab)
+            return self._tab_positions[self._current_tab.item]
         else:
             return None
 
@@ -962,8 +1440,27 @@ class DockGroup(gtk.Container):
         negative the first item is selected. If greater than the number of
         items in the DockGroup, the last item is selected.
         '''
+        old_tab = self._select_item(item_num)
+
+        # Refresh ourselves, a full relayout is only needed when switching
+        # changes our size requisition or the visible tabs
+        if old_tab and self._current_tab and old_tab is not self._current_tab and \
+           self.allocation.width > 1 and \
+           self._can_switch_tab(old_tab, self._current_tab):
+            self._switch_tab(old_tab)
+        else:
+            self.queue_resize()
+
+    def _select_item(self, item_num):
+        '''
+        Make the item at item_num the current item, clamping item_num like
+        set_current_item() does. Returns the previous current tab, if it is
+        still in the DockGroup. Refreshing is left to the caller: adding or
+        removing tabs always needs a relayout.
+        '''
         # Store a reference to the old current tab
-        if self._current_tab and self._current_tab in self._tabs:
+        if self._current_tab and \
+           self._tab_map.get(self._current_tab.item) is self._current_tab:
             old_tab = self._current_tab
         else:
             old_tab = None
@@ -978,21 +1475,19 @@ class DockGroup(gtk.Container):
                 current_tab_index = item_num
 
             self._current_tab = self._tabs[current_tab_index]
-            self._current_tab.last_focused = time()
-            # Update properties on new current tab
-            self._item_title_changed(self._current_tab)
-            self._on_item_title_tooltip_text_changed(self._current_tab)
+
+            # Move the new current tab to the front of the MRU list
+            if self._mru_tabs[0] is not self._current_tab:
+                self._mru_tabs.remove(self._current_tab)
+                self._mru_tabs.insert(0, self._current_tab)
+
+            # The current tab is shown in bold in the list menu
+            self._list_menu_valid = False
             self.emit('item-selected', self._current_tab.item)
         else:
             self._current_tab = None
 
-        # Update properties on old current tab
-        if old_tab:
-            self._item_title_changed(old_tab)
-            self._on_item_title_tooltip_text_changed(old_tab)
-
-        # Refresh ourselves
-        self.queue_resize()
+        return old_tab
 
     def next_item(self):
         '''
@@ -1032,29 +1527,47 @@ class DockGroup(gtk.Container):
         elif position > len(self) - 1:
             position = len(self)
 
-        tab = self._tabs[self.item_num(item)]
-        self._tabs.remove(tab)
+        item_num = self.item_num(item)
+        tab = self._tabs.pop(item_num)
         self._tabs.insert(position, tab)
+        self._reindex_tabs(min(item_num, position))
+        self._list_menu_valid = False
 
     ############################################################################
     # Property notification signal handlers
     ############################################################################
-    def _item_title_changed(self, tab):
-        tab.label.set_text(tab.item.get_title())
+    def _invalidate_tab_metrics(self, tab):
+        tab.metrics = None
         self.queue_resize()
 
-        if tab is self._current_tab:
-            tab.menu_item.child.set_use_markup(True)
-            tab.menu_item.child.set_markup('<b>%s</b>' % tab.item.get_title())
-        else:
-            tab.menu_item.child.set_use_markup(False)
-            tab.menu_item.child.set_markup(tab.item.get_title())
+    def _item_title_changed(self, tab):
+        if tab.label is not None:
+            tab.label.set_text(tab.item.get_title())
+
+        self._invalidate_tab_metrics(tab)
+        self._list_menu_valid = False
 
     def _on_item_title_changed(self, item, pspec, tab):
         self._item_title_changed(tab)
 
-    def _on_item_title_tooltip_text_changed(self, tab):
-        tab.menu_item.set_tooltip_text(tab.item.get_title_tooltip_text())
+    def _on_item_title_tooltip_text_changed(self, item, pspec, tab):
+        self._list_menu_valid = False
+
+    def _on_item_image_changed(self, item, pspec, tab):
+        # Replace the tab icon by a fresh one
+        if tab.image is not None:
+            tab.image.unparent()
+            tab.image.destroy()
+            gtk.widget_push_composite_child()
+            tab.image = item.get_image()
+            gtk.widget_pop_composite_child()
+            tab.image.set_parent(self)
+
+            if self.flags() & gtk.REALIZED:
+                tab.image.set_parent_window(self.window)
+
+        self._invalidate_tab_metrics(tab)
+        self._list_menu_valid = False
 
     ############################################################################
     # Decoration area signal handlers
@@ -1069,13 +1582,40 @@ class DockGroup(gtk.Container):
             y = wy + button.allocation.y + button.allocation.height
             return (x, y, True)
 
+        if not self._list_menu_valid:
+            self._update_list_menu()
+
         self._list_menu.show_all()
         self._list_menu.popup(parent_menu_shell=None, parent_menu_item=None,
                               func=_menu_position, button=1,
                               activate_time=0)
 
-    def _on_list_menu_item_activated(self, menuitem, tab):
-        self.set_current_item(self._tabs.index(tab))
+    def _update_list_menu(self):
+        # The list menu is only built when it is shown, and kept until
+        # the tabs change.
+        for menu_item in self._list_menu.get_children():
+            menu_item.destroy()
+
+        for tab in self._tabs:
+            menu_item = gtk.ImageMenuItem()
+            menu_item.set_image(tab.item.get_image())
+            menu_item.set_label(tab.item.get_title())
+            menu_item.set_tooltip_text(tab.item.get_title_tooltip_text())
+            menu_item.connect('activate', self._on_list_menu_item_activated, tab.item)
+
+            if tab is self._current_tab:
+                menu_item.child.set_use_markup(True)
+                menu_item.child.set_markup('<b>%s</b>' % tab.item.get_title())
+
+            self._list_menu.append(menu_item)
+
+        self._list_menu_valid = True
+
+    def _on_list_menu_item_activated(self, menuitem, item):
+        item_num = self.item_num(item)
+
+        if item_num is not None:
+            self.set_current_item(item_num)
 
     def _on_min_button_clicked(self, button):
         #TODO: Hiding the dockgroup is not a good idea, as it will be 'minimized'
@@ -29,15 +29,15 @@ from simplegeneric import generic
 import gobject
 import gtk
 import gtk.gdk as gdk
-import itertools
 from weakref import WeakKeyDictionary
 
-from .dnd import DRAG_TARGET_ITEM_LIST, Placeholder
+from .dnd import DRAG_TARGET_ITEM_LIST
 from .dockframe import DockFrame
 from .dockpaned import DockPaned
 from .dockgroup import DockGroup
 from .dockitem import DockItem
 from .docksettings import settings
+from .trace import is_enabled, trace, traced
 from .util import flatten
 
 # On OSX/X11 Utility windows are above all windows,
@@ -46,6 +46,10 @@ PROVIDE_FLOATING_WINDOW_HINTS = sys.platform != 'darwin'
 
 MAGIC_BORDER_SIZE = 10
 
+# Widgets the layout connects to, the content of dock items is left alone
+DOCK_CONTAINERS = (DockFrame, DockPaned, DockGroup)
+DOCK_WIDGETS = DOCK_CONTAINERS + (DockItem,)
+
 DragData = namedtuple('DragData', 'drop_widget leave received')
 
 
@@ -77,6 +81,10 @@ class DockLayout(gobject.GObject):
 
         self.frames = set()
         self._signal_handlers = {} # Map widget -> set([signals, ...])
+        self._toplevels = {} # Map toplevel window -> (set-focus signal, set([frames, ...]))
+        self._frame_toplevels = {} # Map frame -> toplevel window
+        self._names = {} # Map name -> [widgets, ...]
+        self._widget_names = {} # Map widget -> name in self._names
 
         self._focused_item = None
         self._focused_group = None
@@ -88,10 +96,12 @@ class DockLayout(gobject.GObject):
         assert isinstance(frame, DockFrame)
         self.frames.add(frame)
         self.add_signal_handlers(frame)
+        self.update_toplevel(frame)
 
     def remove(self, frame):
         self.remove_signal_handlers(frame)
         self.frames.remove(frame)
+        self.update_toplevel(frame)
 
     def get_main_frames(self):
         """
@@ -112,30 +122,47 @@ class DockLayout(gobject.GObject):
 
     def get_widgets(self, name):
         """
-        Get a set of widgets based on their name.
+        Get a set of widgets based on their name. Dock widgets (frames, paneds,
+        groups and items) are looked up in an index. Only if none of them
+        has the name, the content of the dock items is searched.
         """
-        return filter(lambda w: w.get_name() == name,
-                      itertools.chain.from_iterable(flatten(frame) for frame in self.frames))
+        widgets = self._names.get(name)
+
+        if widgets:
+            return list(widgets)
+
+        return [w for frame in self.frames for w in flatten(frame) if w.get_name() == name]
+
+    def _index_widget(self, widget):
+        name = widget.get_name()
+        self._names.setdefault(name, []).append(widget)
+        self._widget_names[widget] = name
+
+    def _unindex_widget(self, widget):
+        name = self._widget_names.pop(widget)
+        widgets = self._names[name]
+        widgets.remove(widget)
+
+        if not widgets:
+            del self._names[name]
 
     def _get_signals(self, widget):
         """
         Get a list of signals to be registered for a specific widget.
         """
-        if isinstance(widget, DockPaned):
+        if isinstance(widget, DockFrame):
+            signals = (('add', self.on_widget_add),
+                       ('remove', self.on_widget_remove),
+                       ('hierarchy-changed', self.on_frame_hierarchy_changed))
+        elif isinstance(widget, DockPaned):
             signals = (('item-added', self.on_widget_add),
                        ('item-removed', self.on_widget_remove))
         elif isinstance(widget, DockGroup):
             signals = (('item-added', self.on_widget_add),
                        ('item-removed', self.on_widget_remove),
                        ('item-selected', self.on_dockgroup_item_selected))
-        elif isinstance(widget, DockItem):
-            signals = (('close', self.on_dockitem_close),)
-        elif isinstance(widget, gtk.Container):
-            signals = (('add', self.on_widget_add),
-                       ('remove', self.on_widget_remove))
         else:
-            signals = ()
-
+            signals = (('close', self.on_dockitem_close),)
 
         return signals + (('drag-motion', self.on_widget_drag_motion),
                           ('drag-leave', self.on_widget_drag_leave),
@@ -143,14 +170,18 @@ class DockLayout(gobject.GObject):
                           ('drag-data-received', self.on_widget_drag_data_received),
                           ('drag-end', self.on_widget_drag_end),
                           ('drag-failed', self.on_widget_drag_failed),
-                          ('notify::is-focus', self.on_widget_is_focus))
+                          ('notify::name', self.on_widget_name_changed))
 
     def add_signal_handlers(self, widget):
         """
         Set up signal handlers for layout and child widgets. Also group state is changed
         from selected to prelight, in order to have one focused widget.
+
+        Only dock widgets (frames, paneds, groups and items) are set up, the
+        content of dock items is left alone. Focus changes are tracked on
+        the toplevel windows instead (see update_toplevel()).
         """
-        if self._signal_handlers.get(widget):
+        if not isinstance(widget, DOCK_WIDGETS) or self._signal_handlers.get(widget):
             return
 
         signals = set()
@@ -170,8 +201,9 @@ class DockLayout(gobject.GObject):
                 self.log.debug(e)
 
         self._signal_handlers[widget] = signals
+        self._index_widget(widget)
 
-        if isinstance(widget, gtk.Container):
+        if isinstance(widget, DOCK_CONTAINERS):
             widget.foreach(self.add_signal_handlers)
 
         # Ensure SELECTED state is only for the selected item
@@ -191,12 +223,38 @@ class DockLayout(gobject.GObject):
                 widget.disconnect(s)
 
             del self._signal_handlers[widget]
+            self._unindex_widget(widget)
 
             # TODO: widget.drag_dest_set_target_list(drag_dest - [DRAG_TARGET_ITEM_LIST])??
 
-            if isinstance(widget, gtk.Container):
+            if isinstance(widget, DOCK_CONTAINERS):
                 widget.foreach(self.remove_signal_handlers)
 
+    def update_toplevel(self, frame):
+        """
+        Track focus changes on the toplevel window of frame. Each toplevel
+        window is connected to once, no matter how many frames it contains.
+        """
+        old_toplevel = self._frame_toplevels.pop(frame, None)
+
+        if old_toplevel:
+            handler, frames = self._toplevels[old_toplevel]
+            frames.discard(frame)
+
+            if not frames:
+                old_toplevel.disconnect(handler)
+                del self._toplevels[old_toplevel]
+
+        toplevel = frame.get_toplevel()
+
+        if frame in self.frames and isinstance(toplevel, gtk.Window):
+            if toplevel not in self._toplevels:
+                self._toplevels[toplevel] = (toplevel.connect('set-focus', self.on_window_set_focus),
+                                             set())
+
+            self._toplevels[toplevel][1].add(frame)
+            self._frame_toplevels[frame] = toplevel
+
     def update_floating_window_title(self, widget):
         frame = widget.get_ancestor(DockFrame)
 
@@ -261,7 +319,7 @@ class DockLayout(gobject.GObject):
             drag_data = self._drag_data
 
             if drag_data and drag_data.leave:
-                self.log.debug('on widget drag leave %s' % drag_data.leave)
+                self.log.debug('on widget drag leave %s', drag_data.leave)
                 drag_data.leave(drag_data.drop_widget)
 
     def on_widget_drag_drop(self, widget, context, x, y, timestamp):
@@ -283,13 +341,12 @@ class DockLayout(gobject.GObject):
         return False
 
 
+    @traced('DockLayout.on_widget_drag_data_received')
     def on_widget_drag_data_received(self, widget, context, x, y, selection_data, info, timestamp):
         '''
         Execute the received handler using the received handler retrieved in the
         drag_drop event handler.
         '''
-        self.log.debug('drag_data_received %s, %s, %s, %s, %s, %s' % (context, x, y, selection_data, info, timestamp))
-
         if DRAG_TARGET_ITEM_LIST[0] in context.targets:
             drag_data = self._drag_data
             assert drag_data.received
@@ -309,16 +366,25 @@ class DockLayout(gobject.GObject):
             context.docklayout = self
             return drag_failed(widget, context, result)
 
-    def on_widget_is_focus(self, widget, pspec):
+    def on_widget_name_changed(self, widget, pspec):
+        self._unindex_widget(widget)
+        self._index_widget(widget)
+
+    def on_frame_hierarchy_changed(self, frame, previous_toplevel):
+        self.update_toplevel(frame)
+
+    def on_window_set_focus(self, window, widget):
         """
         The input focus moved to another widget.
         """
-        if isinstance(widget, DockItem):
+        if not widget:
+            return
+        elif isinstance(widget, DockItem):
             item = widget
         else:
             item = widget.get_ancestor(DockItem)
 
-        if item:
+        if item and item.get_ancestor(DockFrame) in self.frames:
             self._focus_data[item] = widget
 
             if item is not self._focused_item:
@@ -590,21 +656,28 @@ def new(class_, old=None, layout=None):
         new.set_name(old.get_name())
     return new
 
-def dock_group_expose_highlight(self, event):
+def dock_group_highlight_area(self):
+    '''
+    The area to highlight: the drop tab, or the whole group when dropping
+    on the current tab.
+    '''
     try:
         tab = self._visible_tabs[self._drop_tab_index]
     except TypeError:
-        a = event.area
+        tab = None
+
+    if tab and tab is not self._current_tab:
+        return tuple(tab.area)
     else:
-        if tab is self._current_tab:
-            a = event.area
-        else:
-            a = tab.area
+        return (0, 0, self.allocation.width, self.allocation.height)
+
+def dock_group_expose_highlight(self, event):
+    (x, y, width, height) = self._highlight_area
 
     cr = self.window.cairo_create()
     cr.set_source_rgb(0, 0, 0)
     cr.set_line_width(1.0)
-    cr.rectangle(a.x + 0.5, a.y + 0.5, a.width - 1, a.height - 1)
+    cr.rectangle(x + 0.5, y + 0.5, width - 1, height - 1)
     cr.stroke()
 
 def dock_group_highlight(self):
@@ -612,7 +685,17 @@ def dock_group_highlight(self):
         self.log.debug('attaching expose event')
         self._expose_event_id = self.connect_after('expose-event',
                                                    dock_group_expose_highlight)
-    self.queue_draw()
+        self._highlight_area = None
+
+    # Only redraw the old and new highlighted area, and only if it moved
+    area = dock_group_highlight_area(self)
+
+    if area != self._highlight_area:
+        if self._highlight_area:
+            self.queue_draw_area(*self._highlight_area)
+
+        self.queue_draw_area(*area)
+        self._highlight_area = area
 
 def dock_unhighlight(self):
     self.queue_draw()
@@ -625,12 +708,12 @@ def dock_unhighlight(self):
 
 @drag_motion.when_type(DockGroup)
 @with_magic_borders
+@traced('dock_group_drag_motion')
 def dock_group_drag_motion(self, context, x, y, timestamp):
-    self.log.debug('dock_group_drag_motion: %s, %s, %s, %s' % (context, x, y, timestamp))
-
     # Insert the dragged tab before the tab under (x, y)
     drop_tab = self.get_tab_at_pos(x, y)
-    self.log.debug('drop tab at (%d, %d) is %s', x, y, drop_tab)
+    if is_enabled():
+        trace('dock_group_drag_motion.drop_tab', x=x, y=y, drop_tab=drop_tab)
 
     if drop_tab:
         self._drop_tab_index = self._visible_tabs.index(drop_tab)
@@ -642,10 +725,11 @@ def dock_group_drag_motion(self, context, x, y, timestamp):
     dock_group_highlight(self)
 
     def dock_group_drag_data_received(selection_data, info):
-        self.log.debug('%s, %s, %s, %s, %s, %s' % (context, x, y, selection_data, info, timestamp))
         source = context.get_source_widget()
         assert source
-        self.log.debug('Recieving item %s' % source.dragcontext.dragged_object)
+        if is_enabled():
+            trace('dock_group_drag_data_received', x=x, y=y, info=info, timestamp=timestamp,
+                  items=source.dragcontext.dragged_object)
 
         for item in reversed(source.dragcontext.dragged_object):
             self.insert_item(item, visible_position=self._drop_tab_index)
@@ -671,7 +755,7 @@ def dock_group_drag_end(self, context):
 @drag_failed.when_type(DockGroup)
 def dock_group_drag_failed(self, context, result):
     global settings
-    self.log.debug('%s, %s' % (context, result))
+    self.log.debug('%s, %s', context, result)
     if result == 1 and settings[self].can_float: #gtk.DRAG_RESULT_NO_TARGET
         if reduce(lambda a, b: a or b,
                   map(lambda i: settings[i].float_retain_size,
@@ -684,12 +768,11 @@ def dock_group_drag_failed(self, context, result):
         new_group = new(DockGroup, self, layout)
         add_new_group_floating(new_group, layout, size, self.get_pointer())
 
-        for item in self.dragcontext.dragged_object:
-            new_group.append_item(item)
+        new_group.insert_items(self.dragcontext.dragged_object)
 
     else:
-        for item in self.dragcontext.dragged_object:
-            self.insert_item(item, position=self._dragged_tab_index)
+        self.insert_items(self.dragcontext.dragged_object,
+                          position=self._dragged_tab_index)
     return True
 
 ################################################################################
@@ -719,32 +802,26 @@ def dock_paned_highlight(self):
 
 @drag_motion.when_type(DockPaned)
 @with_magic_borders
+@traced('dock_paned_drag_motion')
 def dock_paned_drag_motion(self, context, x, y, timestamp):
-    self.log.debug('dock_paned_drag_motion: %s, %s, %s, %s' % (context, x, y, timestamp))
-
-    handle = self._get_handle_at_pos(x, y)
-    self.log.debug('handle at pos (%d, %d) is %s', x, y, handle)
-
-    if handle:
-        self._drop_handle_index = self._handles.index(handle)
-    else:
-        self._drop_handle_index = None
+    self._drop_handle_index = self._get_handle_index_at_pos(x, y)
+    if is_enabled():
+        trace('dock_paned_drag_motion.drop_handle', x=x, y=y, drop_handle_index=self._drop_handle_index)
 
     dock_paned_highlight(self)
 
     def dock_paned_drag_data_received(selection_data, info):
-        self.log.debug('%s, %s, %s, %s, %s, %s' % (context, x, y, selection_data, info, timestamp))
-
         source = context.get_source_widget()
+        if is_enabled():
+            trace('dock_paned_drag_data_received', x=x, y=y, info=info, timestamp=timestamp,
+                  items=source.dragcontext.dragged_object)
 
-        self.log.debug('Recieving item %s' % source.dragcontext.dragged_object)
         # If on handle: create new DockGroup and add items
         new_group = new(DockGroup, source, context.docklayout)
         self.insert_item(new_group, self._drop_handle_index + 1)
         new_group.show()
 
-        for item in source.dragcontext.dragged_object:
-            new_group.insert_item(item)
+        new_group.insert_items(source.dragcontext.dragged_object)
 
         context.finish(True, True, timestamp) # success, delete, time
 
@@ -763,7 +840,7 @@ def dock_paned_cleanup(self, layout):
         child = self[0]
 
         if isinstance(parent, DockPaned):
-            position = [c for c in parent].index(self)
+            position = parent.item_num(self)
             weight = parent.child_get_property(self, 'weight')
             self.remove(child)
             parent.remove(self)
@@ -786,7 +863,7 @@ def dock_paned_drag_end(self, context):
 def dock_paned_magic_borders_leave(self):
     a = self.get_ancestor(DockFrame)
     if a:
-        a.set_placeholder(None)
+        a.hide_placeholder()
 
 @magic_borders.when_type(DockPaned)
 def dock_paned_magic_borders(self, context, x, y, timestamp):
@@ -813,10 +890,7 @@ def dock_paned_magic_borders(self, context, x, y, timestamp):
         fa = frame.allocation
         allocation = (fa.x + fx, fa.y + fy, allocation[2], allocation[3])
 
-        placeholder = Placeholder()
-        frame.set_placeholder(placeholder)
-        placeholder.size_allocate(allocation)
-        placeholder.show()
+        frame.show_placeholder(allocation)
 
         if create:
             if self.get_orientation() == gtk.ORIENTATION_HORIZONTAL:
@@ -838,10 +912,11 @@ def dock_paned_magic_borders(self, context, x, y, timestamp):
                 new_group = new(DockGroup, source, context.docklayout)
                 add_new_group(current_group, new_group, orientation, position)
 
-                self.log.debug('Recieving item %s' % source.dragcontext.dragged_object)
+                if is_enabled():
+                    trace('dock_paned_magic_borders_data_received', x=x, y=y, info=info,
+                          timestamp=timestamp, items=source.dragcontext.dragged_object)
 
-                for item in source.dragcontext.dragged_object:
-                    new_group.append_item(item)
+                new_group.insert_items(source.dragcontext.dragged_object)
 
                 context.finish(True, True, timestamp) # success, delete, time
 
@@ -858,8 +933,7 @@ def dock_paned_magic_borders(self, context, x, y, timestamp):
                     position = None
                 self.insert_item(new_group, position)
                 new_group.show()
-                for item in source.dragcontext.dragged_object:
-                    new_group.append_item(item)
+                new_group.insert_items(source.dragcontext.dragged_object)
 
                 context.finish(True, True, timestamp) # success, delete, time
 
@@ -882,6 +956,7 @@ def dock_frame_cleanup(self, layout):
     if not self.get_children():
         parent = self.get_parent()
         layout.remove(self)
+        self.set_placeholder(None)
         self.destroy()
         try:
             if parent.get_transient_for():
@@ -894,7 +969,7 @@ def dock_frame_drag_end(self, context):
     cleanup(self, context.docklayout)
 
 def dock_frame_magic_borders_leave(self):
-    self.set_placeholder(None)
+    self.hide_placeholder()
 
 @drag_motion.when_type(DockFrame)
 @magic_borders.when_type(DockFrame)
@@ -924,11 +999,7 @@ def dock_frame_magic_borders(self, context, x, y, timestamp):
     else:
         return None
 
-    placeholder = Placeholder()
-
-    self.set_placeholder(placeholder)
-    placeholder.size_allocate(allocation)
-    placeholder.show()
+    self.show_placeholder(allocation)
 
     current_child = self.get_children()[0]
     assert current_child
@@ -945,10 +1016,11 @@ def dock_frame_magic_borders(self, context, x, y, timestamp):
         new_group = new(DockGroup, source, context.docklayout)
         add_new_group(current_child, new_group, orientation, position)
 
-        self.log.debug('Recieving item %s' % source.dragcontext.dragged_object)
+        if is_enabled():
+            trace('dock_frame_magic_borders_data_received', x=x, y=y, info=info,
+                  timestamp=timestamp, items=source.dragcontext.dragged_object)
 
-        for item in source.dragcontext.dragged_object:
-            new_group.append_item(item)
+        new_group.insert_items(source.dragcontext.dragged_object)
 
         context.finish(True, True, timestamp) # success, delete, time
 
@@ -20,6 +20,7 @@
 
 
 from __future__ import absolute_import
+from bisect import bisect_left
 from logging import getLogger
 
 import gobject
@@ -30,10 +31,25 @@ from .dnd import DockDragContext
 from .util import rect_overlaps
 from .docksettings import settings
 
+# Check for numpy, not required.
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 # The weight we allocate to a newly added item if we can't come up with anything else
 FALLBACK_WEIGHT = 0.2
 
+# Interval (in milliseconds) at which pointer motion is applied while dragging a handle
+HANDLE_DRAG_INTERVAL = 1000 / 60
+
+# Weights adding up to 1.0 within this margin are not normalized
+WEIGHT_EPSILON = 1e-9
+
+# Number of weights from which on scale_weights() uses numpy, if available
+NUMPY_THRESHOLD = 64
+
 
 class _DockPanedHandle(object):
     '''
@@ -55,13 +71,17 @@ class _DockPanedItem(object):
     __slots__ = ['child',      # child widget
                  'weight',     # relative weight [0..1]
                  'weight_request', # requested weight, processed in size_allocate()
-                 'min_size'] # minimum relative weight
+                 'min_size',   # minimum relative weight
+                 'allocation', # last allocation given to child (tuple), None if unknown
+                 'size_request_handler'] # child size-request signal handler id
 
     def __init__(self):
         self.child = None
         self.weight = None
         self.weight_request = None
         self.min_size = None
+        self.allocation = None
+        self.size_request_handler = None
 
     def __contains__(self, pos):
         return rect_overlaps(self.child.allocation, *pos)
@@ -96,6 +116,12 @@ class DockPaned(gtk.Container):
               0,
               1,
               0,
+              gobject.PARAM_READWRITE),
+         'outline-resize':
+             (gobject.TYPE_BOOLEAN,
+              'outline resize',
+              'only draw an outline while dragging a handle',
+              False,
               gobject.PARAM_READWRITE)}
     __gchild_properties__ = \
          {'weight':
@@ -124,15 +150,28 @@ class DockPaned(gtk.Container):
         # Initialize attributes
         self._items = []
         self._handles = []
+        self._item_map = {}         # Map child -> _DockPanedItem
+        self._item_positions = {}   # Map child -> index in self._items
+        self._handle_offsets = []   # Sorted end offsets of the handles along our axis
         self._hcursor = None
         self._vcursor = None
+        self._outline = None
+
+        # Initialize size allocation cache
+        self._allocation_cache_key = None
+        self._allocation_cache = []
+        self._allocation_cache_hits = 0
+        self._allocation_cache_misses = 0
 
         # Initialize handle dragging (not to be confused with DnD...)
         self._dragcontext = DockDragContext()
+        self._drag_position = None      # latest pointer position while dragging a handle
+        self._drag_source_id = None     # timeout applying self._drag_position
 
         # Initialize properties
         self.set_handle_size(4)
         self.set_orientation(gtk.ORIENTATION_HORIZONTAL)
+        self.set_outline_resize(False)
 
     ############################################################################
     # Private
@@ -158,6 +197,18 @@ class DockPaned(gtk.Container):
                 switch = True
                 index += 1
 
+    def _reindex_items(self, start=0):
+        '''
+        :param start: the index of the first item whose position changed.
+
+        The :meth:`_reindex_items` method updates the child to position map for
+        all items starting at the index specified by `start`.
+        '''
+        positions = self._item_positions
+
+        for index in xrange(start, len(self._items)):
+            positions[self._items[index].child] = index
+
     def _insert_item(self, child, position=None, weight=None):
         '''
         :param child: a :class:`gtk.Widget` to use as the contents of the item.
@@ -171,22 +222,43 @@ class DockPaned(gtk.Container):
         the :meth:`add`, :meth:`insert_item`, :meth:`append_item` and
         :meth:`prepend_item` methods.
         '''
+        if position is None or position < 0 or position > len(self):
+            position = len(self)
+
+        self._add_item(child, position, weight)
+        self._reindex_items(position)
+
+        self._invalidate_allocation()
+        self.queue_resize()
+        self.emit('item-added', child)
+        return self.item_num(child)
+
+    def _add_item(self, child, position, weight=None):
+        '''
+        :param child: a :class:`gtk.Widget` to use as the contents of the item.
+        :param position: the index (starting at 0) at which to insert the item.
+        :param weight: The relative amount of space the child should get. No guarantees.
+
+        The :meth:`_add_item` method does the bookkeeping for inserting a new
+        item. Callers are responsible for updating the item positions with
+        :meth:`_reindex_items`, queueing a resize and emitting the
+        ``item-added`` signal.
+        '''
         assert isinstance(child, gtk.Widget)
-        assert self.item_num(child) is None
+        assert child not in self._item_map
         assert not child.get_parent()
 
-        if position is None or position < 0:
-            position = len(self)
-
         # Create new _DockPanedItem
         item = _DockPanedItem()
         item.child = child
         item.child.set_parent(self)
+        item.size_request_handler = child.connect('size-request', self._on_child_size_request, item)
 
         if self.flags() & gtk.REALIZED:
             item.child.set_parent_window(self.window)
 
         self._items.insert(position, item)
+        self._item_map[child] = item
 
         # Create a _DockPanedHandle if needed
         if len(self) > 1:
@@ -214,10 +286,6 @@ class DockPaned(gtk.Container):
         else:
             item.weight_request = FALLBACK_WEIGHT
 
-        self.queue_resize()
-        self.emit('item-added', child)
-        return self.item_num(child)
-
     def _remove_item(self, child):
         '''
         :param child: a :class:`gtk.Widget` to use as the contents of the item.
@@ -229,8 +297,12 @@ class DockPaned(gtk.Container):
         assert item_num is not None
 
         # Remove the DockPanedItem from the list
+        child.disconnect(self._items[item_num].size_request_handler)
         child.unparent()
         del self._items[item_num]
+        del self._item_map[child]
+        del self._item_positions[child]
+        self._reindex_items(item_num)
 
         # If there are still items/handles in the list, we'd like to
         # remove a handle...
@@ -240,6 +312,7 @@ class DockPaned(gtk.Container):
         assert len(self._items) == len(self._handles) + 1 or \
                len(self._items) == len(self._handles) == 0
 
+        self._invalidate_allocation()
         self.queue_resize()
         self.emit('item-removed', child)
 
@@ -252,6 +325,7 @@ class DockPaned(gtk.Container):
         '''
         handle = _DockPanedHandle()
         self._handles.insert(position, handle)
+        del self._handle_offsets[:]
 
     def _remove_handle(self, position):
         '''
@@ -270,6 +344,105 @@ class DockPaned(gtk.Container):
             # be located before the DockPanedItem we just removed
             del self._handles[position - 1]
 
+        del self._handle_offsets[:]
+
+    def _drag_handle(self, x, y):
+        '''
+        :param x: the x coordinate of the pointer.
+        :param y: the y coordinate of the pointer.
+
+        The :meth:`_drag_handle` method moves the handle being dragged to the
+        position specified by `x` and `y`, adjusting the size of the items
+        around it.
+        '''
+        handle = self._dragcontext.dragged_object
+
+        if self._orientation == gtk.ORIENTATION_HORIZONTAL:
+            delta_size = int(x - handle.area.x - self._dragcontext.offset_x)
+        else:
+            delta_size = int(y - handle.area.y - self._dragcontext.offset_y)
+
+        handle_index = self._handles.index(handle)
+
+        if delta_size < 0:
+            # Enlarge the item after and shrink the items before the handle
+            enlarge = self._items[handle_index + 1]
+            shrink = reversed(self._items[:handle_index + 1])
+            self._redistribute_size(abs(delta_size), enlarge, shrink)
+        elif delta_size > 0:
+            # Enlarge the item before and shrink the items after the handle
+            enlarge = self._items[handle_index]
+            shrink = self._items[handle_index + 1:]
+            self._redistribute_size(delta_size, enlarge, shrink)
+
+    def _flush_drag_handle(self):
+        '''
+        The :meth:`_flush_drag_handle` method applies the latest pointer
+        position received while dragging a handle, if any.
+        '''
+        if self._drag_source_id is not None:
+            gobject.source_remove(self._drag_source_id)
+            self._drag_source_id = None
+
+        if self._drag_position is not None:
+            x, y = self._drag_position
+            self._drag_position = None
+
+            if self._dragcontext.dragging and \
+               self._dragcontext.dragged_object in self._handles:
+                self._drag_handle(x, y)
+
+    def _on_drag_handle_timeout(self):
+        self._drag_source_id = None
+        self._flush_drag_handle()
+        return False
+
+    def _move_outline(self, x, y):
+        '''
+        :param x: the x coordinate of the pointer.
+        :param y: the y coordinate of the pointer.
+
+        The :meth:`_move_outline` method shows the outline of the handle being
+        dragged at the position specified by `x` and `y`. The outline is a
+        child window of the dockpaned, placed on top of the child widgets.
+        '''
+        if not self.flags() & gtk.REALIZED:
+            return
+
+        a = self.allocation
+        handle_size = self._handle_size
+
+        if self._orientation == gtk.ORIENTATION_HORIZONTAL:
+            position = int(x - self._dragcontext.offset_x)
+            rect = (max(0, min(position, a.width - handle_size)), 0, handle_size, a.height)
+        else:
+            position = int(y - self._dragcontext.offset_y)
+            rect = (0, max(0, min(position, a.height - handle_size)), a.width, handle_size)
+
+        if not self._outline:
+            self._outline = gdk.Window(self.window,
+                                       x = rect[0],
+                                       y = rect[1],
+                                       width = max(rect[2], 1),
+                                       height = max(rect[3], 1),
+                                       window_type = gdk.WINDOW_CHILD,
+                                       wclass = gdk.INPUT_OUTPUT,
+                                       event_mask = 0)
+            self._outline.set_background(self.style.dark[gtk.STATE_NORMAL])
+        else:
+            self._outline.move_resize(rect[0], rect[1], max(rect[2], 1), max(rect[3], 1))
+
+        self._outline.show()
+        self._outline.raise_()
+
+    def _hide_outline(self):
+        '''
+        The :meth:`_hide_outline` method hides the handle outline shown by
+        :meth:`_move_outline`.
+        '''
+        if self._outline:
+            self._outline.hide()
+
     def _get_n_handles(self):
         '''
         :returns: the number of handles in the dockpaned.
@@ -289,17 +462,41 @@ class DockPaned(gtk.Container):
         contains the position specified by `x` and `y` or :const:`None` if no
         handle is at that position.
         '''
-        for handle in self._handles:
-            if (x, y) in handle:
-                return handle
+        index = self._get_handle_index_at_pos(x, y)
+
+        if index is not None:
+            return self._handles[index]
+        else:
+            return None
+
+    def _get_handle_index_at_pos(self, x, y):
+        '''
+        :param x: the x coordinate of the position.
+        :param y: the y coordinate of the position.
+        :returns: the index of the handle at the position specified by x and y
+                  or :const:`None`.
+
+        The :meth:`_get_handle_index_at_pos` method looks up the first handle
+        ending at or after the position along the dockpaned's axis in
+        :attr:`_handle_offsets` and checks if its area contains the position.
+        Handle offsets are updated in :meth:`do_size_allocate`, so no handle is
+        found in between adding or removing items and the next size allocation.
+        '''
+        if self._orientation == gtk.ORIENTATION_HORIZONTAL:
+            index = bisect_left(self._handle_offsets, x)
+        else:
+            index = bisect_left(self._handle_offsets, y)
+
+        if index < len(self._handle_offsets) and (x, y) in self._handles[index]:
+            return index
         else:
             return None
 
     def _item_for_child(self, child):
-        for item in self._items:
-            if item.child is child:
-                return item
-        raise ValueError('child widget %s not in paned' % child)
+        try:
+            return self._item_map[child]
+        except KeyError:
+            raise ValueError('child widget %s not in paned' % child)
 
     def _size(self, allocation):
         '''
@@ -356,6 +553,7 @@ class DockPaned(gtk.Container):
             if delta_size == 0:
                 break
 
+        self._invalidate_allocation()
         self.queue_resize()
 
     def _redistribute_weight(self, size):
@@ -396,17 +594,99 @@ class DockPaned(gtk.Container):
 
         # First ensure all remaining items can be placed
         for i, w in zip(other_items,
-                        fair_scale(1.0 - sum(i.weight_request for i in requested_items), \
-                                   [(i.weight, sf * i.min_size / size) for i in other_items])):
+                        scale_weights(1.0 - sum(i.weight_request for i in requested_items),
+                                      [i.weight for i in other_items],
+                                      [sf * i.min_size / size for i in other_items])):
             i.weight = w
 
         # Divide what's left over the requesting items
         for i, w in zip(requested_items,
-                        fair_scale(1.0 - sum(i.weight for i in other_items), \
-                                   [(i.weight_request, sf * i.min_size / size) for i in requested_items])):
+                        scale_weights(1.0 - sum(i.weight for i in other_items),
+                                      [i.weight_request for i in requested_items],
+                                      [sf * i.min_size / size for i in requested_items])):
             i.weight = w
             i.weight_request = None
 
+        # Canonical form: weights add up to 1.0, so the same layout always
+        # ends up with the same weights
+        total = sum(i.weight for i in items)
+
+        if total > 0 and abs(total - 1.0) > WEIGHT_EPSILON:
+            for i in items:
+                i.weight = i.weight / total
+
+    def _allocation_key(self, allocation):
+        '''
+        :param allocation: the allocation offered to the dockpaned.
+        :returns: a key describing the size, weights and minimum sizes of the
+                  items in the dockpaned.
+
+        The key is recorded after :meth:`_compute_allocation` is done. A later
+        size allocation yielding the same key can reuse its child rectangles.
+        '''
+        return (allocation.width, allocation.height,
+                self._orientation, self._handle_size,
+                tuple((i.weight, i.weight_request, i.min_size) for i in self._items))
+
+    def _compute_allocation(self, allocation):
+        '''
+        :param allocation: the allocation offered to the dockpaned.
+        :returns: a list of :class:`gdk.Rectangle`, one for each object
+                  returned by :meth:`_children`.
+
+        Distribute the allocation over the items and handles in the dockpaned.
+        '''
+        size = self._effective_size(allocation)
+
+        self._redistribute_weight(size)
+
+        # Divide the available pixels, sizes always add up to size exactly
+        sizes = iter(apportion(size, [i.weight for i in self._items]))
+
+        rects = []
+        cx = cy = 0  # current x and y counters
+        handle_size = self._handle_size
+
+        # Allocate child widgets: both items and handles, so we can simply increment
+        for child in self._children():
+            rect = gdk.Rectangle()
+            rect.x = cx
+            rect.y = cy
+
+            if isinstance(child, _DockPanedItem):
+                s = sizes.next()
+
+                if self._orientation == gtk.ORIENTATION_HORIZONTAL:
+                    rect.height = allocation.height
+                    rect.width = s
+                    cx += s
+                else:
+                    rect.height = s
+                    rect.width = allocation.width
+                    cy += s
+
+            elif isinstance(child, _DockPanedHandle):
+                if self._orientation == gtk.ORIENTATION_HORIZONTAL:
+                    rect.height = allocation.height
+                    rect.width = handle_size
+                    cx += handle_size
+                else:
+                    rect.height = handle_size
+                    rect.width = allocation.width
+                    cy += handle_size
+
+            rects.append(rect)
+
+        return rects
+
+    def _invalidate_allocation(self):
+        '''
+        Forget the child rectangles computed by the last size allocation, for
+        example when items are added, removed or reordered.
+        '''
+        self._allocation_cache_key = None
+        self._allocation_cache = []
+
 
     ############################################################################
 
@@ -421,10 +701,7 @@ class DockPaned(gtk.Container):
         return len(self._items)
 
     def __contains__(self, child):
-        for i in self._items:
-            if i.child is child:
-                return True
-        return False
+        return child in self._item_map
 
     def __iter__(self):
         for i in self._items:
@@ -438,12 +715,16 @@ class DockPaned(gtk.Container):
             return self.get_handle_size()
         elif pspec.name == 'orientation':
             return self.get_orientation()
+        elif pspec.name == 'outline-resize':
+            return self.get_outline_resize()
 
     def do_set_property(self, pspec, value):
         if pspec.name == 'handle-size':
             self.set_handle_size(value)
         elif pspec.name == 'orientation':
             self.set_orientation(value)
+        elif pspec.name == 'outline-resize':
+            self.set_outline_resize(value)
 
     ############################################################################
     # GtkWidget
@@ -476,6 +757,13 @@ class DockPaned(gtk.Container):
         self._vcursor = gdk.Cursor(self.get_display(), gdk.SB_V_DOUBLE_ARROW)
 
     def do_unrealize(self):
+        self._flush_drag_handle()
+        self._dragcontext.reset()
+
+        if self._outline:
+            self._outline.destroy()
+            self._outline = None
+
         self._hcursor = None
         self._vcursor = None
         self.window.set_user_data(None)
@@ -535,51 +823,31 @@ class DockPaned(gtk.Container):
         ####################################################################
 
         if self._items:
-            size = self._effective_size(allocation)
-
-            self._redistribute_weight(size)
+            key = self._allocation_key(allocation)
 
-            cx = cy = 0  # current x and y counters
-            handle_size = self._handle_size
-
-            # Allocate child widgets: both items and handles, so we can simply increment
-            for child in self._children():
-                rect = gdk.Rectangle()
-                rect.x = cx
-                rect.y = cy
+            if key == self._allocation_cache_key:
+                self._allocation_cache_hits += 1
+            else:
+                self._allocation_cache_misses += 1
+                self._allocation_cache = self._compute_allocation(allocation)
+                self._allocation_cache_key = self._allocation_key(allocation)
 
+            # Only allocate children whose rectangle changed or that
+            # requested a new size themselves (see _on_child_size_request).
+            for child, rect in zip(self._children(), self._allocation_cache):
                 if isinstance(child, _DockPanedItem):
-                    s = round(child.weight * size)
-
-                    if self._orientation == gtk.ORIENTATION_HORIZONTAL:
-                        rect.height = allocation.height
-                        rect.width = s
-                        cx += s
-
-                        if child is self._items[-1]:
-                            rect.width += allocation.width - cx
-                    else:
-                        rect.height = s
-                        rect.width = allocation.width
-                        cy += s
-
-                        if child is self._items[-1]:
-                            rect.height += allocation.height - cy
-
-                    child.child.size_allocate(rect)
-
-                elif isinstance(child, _DockPanedHandle):
-                    if self._orientation == gtk.ORIENTATION_HORIZONTAL:
-                        rect.height = allocation.height
-                        rect.width = handle_size
-                        cx += handle_size
-                    else:
-                        rect.height = handle_size
-                        rect.width = allocation.width
-                        cy += handle_size
-
+                    if child.allocation != tuple(rect):
+                        child.child.size_allocate(rect)
+                        child.allocation = tuple(rect)
+                else:
                     child.area = rect
 
+            # Update handle offsets used for hit testing
+            if self._orientation == gtk.ORIENTATION_HORIZONTAL:
+                self._handle_offsets = [h.area.x + h.area.width for h in self._handles]
+            else:
+                self._handle_offsets = [h.area.y + h.area.height for h in self._handles]
+
         # Accept new allocation
         self.allocation = allocation
 
@@ -622,6 +890,12 @@ class DockPaned(gtk.Container):
     def do_button_release_event(self, event):
         # Reset drag context
         if event.button == self._dragcontext.source_button:
+            # Outline resize: the handle is actually moved on release
+            if self._outline_resize and self._dragcontext.dragging:
+                self._hide_outline()
+                self._drag_position = (event.x, event.y)
+
+            self._flush_drag_handle()
             self._dragcontext.reset()
             self.window.set_cursor(None)
             return True
@@ -638,38 +912,25 @@ class DockPaned(gtk.Container):
             else:
                 cursor = self._vcursor
 
-        # Drag a handle
+        # Drag a handle. When outline-resize is set, only the outline moves
+        # until the handle is released. Otherwise only the latest pointer
+        # position is kept, it is applied at most once every
+        # HANDLE_DRAG_INTERVAL milliseconds so fast pointer motion does not
+        # trigger a size allocation for each event.
         if self._dragcontext.dragging:
             if self._orientation == gtk.ORIENTATION_HORIZONTAL:
                 cursor = self._hcursor
-                delta_size = int(event.x -
-                                 self._dragcontext.dragged_object.area.x -
-                                 self._dragcontext.offset_x)
             else:
                 cursor = self._vcursor
-                delta_size = int(event.y -
-                                 self._dragcontext.dragged_object.area.y -
-                                 self._dragcontext.offset_y)
-
-            handle_index = self._handles.index(self._dragcontext.dragged_object)
-            item_after = self._items[handle_index + 1]
-
-            if delta_size < 0:
-                # Enlarge the item after and shrink the items before the handle
-                delta_size = abs(delta_size)
-                enlarge = item_after
-                shrink = reversed(self._items[:self._items.index(item_after)])
-                self._redistribute_size(delta_size, enlarge, shrink)
-            elif delta_size > 0:
-                # Enlarge the item before and shrink the items after the handle
-                enlarge = self._items[handle_index]
-                shrink = self._items[self._items.index(item_after):]
-                self._redistribute_size(delta_size, enlarge, shrink)
+
+            if self._outline_resize:
+                self._move_outline(event.x, event.y)
             else:
-                enlarge = None
-                shrink = []
+                self._drag_position = (event.x, event.y)
 
-            self.queue_resize()
+                if self._drag_source_id is None:
+                    self._drag_source_id = gobject.timeout_add(HANDLE_DRAG_INTERVAL,
+                                                               self._on_drag_handle_timeout)
 
         # Set the cursor we decided upon above...
         if cursor:
@@ -704,6 +965,13 @@ class DockPaned(gtk.Container):
             item.weight_request = value
             child.child_notify('weight')
 
+    ############################################################################
+    # Child signal handlers
+    ############################################################################
+    def _on_child_size_request(self, child, requisition, item):
+        # The child queued a resize, make sure it gets allocated again
+        item.allocation = None
+
     ############################################################################
     # EtkDockPaned
     ############################################################################
@@ -743,6 +1011,40 @@ class DockPaned(gtk.Container):
         self.notify('orientation')
         self.queue_resize()
 
+    def get_outline_resize(self):
+        '''
+        :return: :const:`True` if only an outline is drawn while dragging a handle.
+
+        Retrieves the outline-resize mode of the dockpaned.
+        '''
+        return self._outline_resize
+
+    def set_outline_resize(self, outline_resize):
+        '''
+        :param outline_resize: :const:`True` to only draw an outline while
+                               dragging a handle.
+
+        Sets the outline-resize mode of the dockpaned. In outline-resize mode
+        dragging a handle only moves an outline of the handle, the child
+        widgets are resized once when the handle is released. This is useful
+        for child widgets that are expensive to resize.
+        '''
+        self._outline_resize = bool(outline_resize)
+        self.notify('outline-resize')
+
+        if not self._outline_resize:
+            self._hide_outline()
+
+    def get_allocation_cache_stats(self):
+        '''
+        :return: a (hits, misses) tuple.
+
+        Retrieves the number of size allocations that reused the child
+        rectangles computed by a previous size allocation (hits) and the
+        number of size allocations that had to compute them (misses).
+        '''
+        return (self._allocation_cache_hits, self._allocation_cache_misses)
+
     def append_item(self, child):
         '''
         :param child: the :class:`gtk.Widget` to use as the contents of the item.
@@ -777,6 +1079,42 @@ class DockPaned(gtk.Container):
         '''
         return self._insert_item(child, position, weight)
 
+    def insert_items(self, children, position=None, weights=None):
+        '''
+        :param children: a list of :class:`gtk.Widget` objects to use as the
+                         contents of the items.
+        :param position: the index (starting at 0) at which to insert the first
+                         item, negative or :const:`None` to append the items
+                         after all other items.
+        :param weights: a list with the relative amount of space each child
+                        should get, or :const:`None`. No guarantees.
+        :returns: a list with the index numbers of the items in the dockpaned.
+
+        The :meth:`insert_items` method inserts several items into the
+        dockpaned at once, starting at the location specified by `position`.
+        The dockpaned is resized once, and the ``item-added`` signal is emitted
+        for each child after all items have been inserted.
+        '''
+        if position is None or position < 0 or position > len(self):
+            position = len(self)
+
+        if weights is None:
+            weights = [None] * len(children)
+
+        assert len(weights) == len(children)
+
+        for offset, (child, weight) in enumerate(zip(children, weights)):
+            self._add_item(child, position + offset, weight)
+
+        self._reindex_items(position)
+        self._invalidate_allocation()
+        self.queue_resize()
+
+        for child in children:
+            self.emit('item-added', child)
+
+        return [self.item_num(child) for child in children]
+
     def remove_item(self, item_num):
         '''
         :param item_num: the index (starting from 0) of the item to remove. If
@@ -804,10 +1142,7 @@ class DockPaned(gtk.Container):
         contains the widget specified by `child` or :const:`None` if no item
         contains `child`.
         '''
-        try:
-            return self.get_children().index(child)
-        except ValueError:
-            pass
+        return self._item_positions.get(child)
 
     def get_nth_item(self, item_num):
         '''
@@ -860,8 +1195,10 @@ class DockPaned(gtk.Container):
             position = len(self)
 
         item = self._items[item_num]
-        self._items.remove(item)
+        del self._items[item_num]
         self._items.insert(position, item)
+        self._reindex_items(min(item_num, position))
+        self._invalidate_allocation()
         self.queue_resize()
 
 ############################################################################
@@ -879,6 +1216,11 @@ def fair_scale(weight, wmpairs):
     of calculated weights that add up to weight, but are no smaller than their specified
     min_weight's.
 
+    Clamping a pair to its min_weight only lowers the scale factor for the remaining
+    pairs, so pairs are visited once, lowest weight/min_weight ratio first, until the
+    first pair that fits. All pairs after that one fit as well. If weight is used up,
+    every remaining pair is assigned its min_weight.
+
     >>> fair_scale(.7, ((.3, .2), (.5, .1)))
     [0.26249999999999996, 0.43749999999999994]
     >>> fair_scale(.5, ((.3, .2), (.5, .1)))
@@ -886,25 +1228,115 @@ def fair_scale(weight, wmpairs):
     >>> fair_scale(.4, ((.3, .2), (.5, .1)))
     [0.20000000000000001, 0.20000000000000001]
     """
-    # List of new weights
-    n = [0] * len(wmpairs)
-    # Values that have been assigned their min_weight end up in this list:
+    def ratio(index):
+        w, m = wmpairs[index]
+        if m > 0:
+            return float(w) / m
+        return float('inf')
+
+    # Values that have been assigned their min_weight are flagged in this list:
     skip = [False] * len(wmpairs)
-    while True:
+    total = sum(w for w, m in wmpairs)
+
+    for i in sorted(xrange(len(wmpairs)), key=ratio):
+        w, m = wmpairs[i]
         try:
-            f = weight / sum(a[0] for a, s in zip(wmpairs, skip) if not s)
+            f = weight / total
         except ZeroDivisionError:
             f = 0
-        for i, (w, m) in enumerate(wmpairs):
-            if skip[i]:
-                continue
-            n[i] = w * f
-            if n[i] < m:
-                n[i] = m
-                weight -= m
-                skip[i] = True
-                break
-        else:
-            break # quit while loop
-    return n
+        if w * f >= m and f >= 0:
+            break # all remaining pairs fit
+        weight -= m
+        total -= w
+        skip[i] = True
+
+    try:
+        f = weight / sum(a[0] for a, s in zip(wmpairs, skip) if not s)
+    except ZeroDivisionError:
+        f = 0
+    return [m if s else w * f for (w, m), s in zip(wmpairs, skip)]
+
+def fair_scale_array(weight, weights, min_weights):
+    """
+    Vectorized version of fair_scale() for numpy arrays of weights and
+    min_weights. Returns an array of calculated weights.
+    """
+    n = len(weights)
+
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        ratios = numpy.where(min_weights > 0, weights / min_weights, numpy.inf)
+
+    order = numpy.argsort(ratios, kind='mergesort')
+    w = weights[order]
+    m = min_weights[order]
+
+    # Weight left and sum of weights left before visiting each pair
+    weight_left = weight - numpy.concatenate(([0.0], numpy.cumsum(m)[:-1]))
+    total_left = w.sum() - numpy.concatenate(([0.0], numpy.cumsum(w)[:-1]))
+
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        f = numpy.where(total_left != 0, weight_left / total_left, 0.0)
+
+    fits = (w * f >= m) & (f >= 0)
+
+    # Pairs are clamped up to the first pair that fits
+    if fits.any():
+        clamped = order[:numpy.argmax(fits)]
+    else:
+        clamped = order
+
+    skip = numpy.zeros(n, dtype=bool)
+    skip[clamped] = True
+
+    total = weights[~skip].sum()
+
+    if total:
+        f = (weight - min_weights[skip].sum()) / total
+    else:
+        f = 0.0
+
+    return numpy.where(skip, min_weights, weights * f)
+
+def scale_weights(weight, weights, min_weights):
+    """
+    Scale weights so they add up to weight, but are no smaller than their
+    corresponding min_weights, see fair_scale(). Long lists are handled by
+    fair_scale_array() if numpy is available.
+    """
+    if numpy is not None and len(weights) >= NUMPY_THRESHOLD:
+        return fair_scale_array(weight,
+                                numpy.array(weights, dtype=float),
+                                numpy.array(min_weights, dtype=float)).tolist()
+    else:
+        return fair_scale(weight, zip(weights, min_weights))
+
+def apportion(size, weights):
+    """
+    Largest remainder apportionment.
+    An integer size and a list of weights is provided. The result is a list of integers
+    that add up to size, proportional to the weights. Each value is the integer part of
+    its exact share, the pixels left over go to the values with the largest fractional
+    parts (the first one wins a tie), so the result only depends on the input.
+
+    >>> apportion(10, [.5, .25, .25])
+    [5, 3, 2]
+    >>> apportion(100, [1., 1., 1.])
+    [34, 33, 33]
+    >>> apportion(-4, [.5, .5])
+    [0, 0]
+    """
+    total = float(sum(weights))
+
+    if size <= 0 or total <= 0:
+        return [0] * len(weights)
+
+    shares = [w * size / total for w in weights]
+    sizes = [int(share) for share in shares]
+    left = int(size) - sum(sizes)
+
+    by_remainder = sorted(xrange(len(shares)), key=lambda i: sizes[i] - shares[i])
+
+    for i in by_remainder[:left]:
+        sizes[i] += 1
 
+    return sizes
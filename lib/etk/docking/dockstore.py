@@ -107,7 +107,7 @@ def parent_attributes(widget):
     d = {}
 
     if isinstance(container, DockPaned):
-        paned_item = [i for i in container._items if i.child is widget][0]
+        paned_item = container._item_for_child(widget)
         if paned_item.weight:
             d['weight'] = str(int(paned_item.weight * 100))
 
@@ -141,8 +141,11 @@ def dock_group_attributes(widget):
 
 @attributes.when_type(DockPaned)
 def dock_paned_attributes(widget):
-    return dict(orientation=(widget.get_orientation() == gtk.ORIENTATION_HORIZONTAL and 'horizontal' or 'vertical'),
-                **parent_attributes(widget))
+    d = dict(orientation=(widget.get_orientation() == gtk.ORIENTATION_HORIZONTAL and 'horizontal' or 'vertical'),
+             **parent_attributes(widget))
+    if widget.get_outline_resize():
+        d['outline_resize'] = 'true'
+    return d
 
 @attributes.when_type(DockFrame)
 def dock_frame_attributes(widget):
@@ -193,7 +196,7 @@ def dock_group_factory(parent, weight=None, name=None):
     return group
 
 @factory('dockpaned')
-def dock_paned_factory(parent, orientation, weight=None, name=None):
+def dock_paned_factory(parent, orientation, weight=None, name=None, outline_resize=None):
     paned = DockPaned()
 
     if name:
@@ -204,6 +207,9 @@ def dock_paned_factory(parent, orientation, weight=None, name=None):
     else:
         paned.set_orientation(gtk.ORIENTATION_VERTICAL)
 
+    if outline_resize == 'true':
+        paned.set_outline_resize(True)
+
     if weight is not None:
         item = parent.insert_item(paned, weight=float(weight) / 100.)
     else:
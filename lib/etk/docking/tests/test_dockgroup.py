@@ -175,6 +175,256 @@ class TestDockGroup(unittest.TestCase):
         dockitem3.destroy()
         dockgroup.destroy()
 
+    def test_insert_items(self):
+        added_events = []
+
+        def on_item_added(dockgroup, item):
+            self.assertTrue(item in dockgroup)
+            added_events.append(item)
+
+        dockitem1 = DockItem()
+        dockitem2 = DockItem()
+        dockitem3 = DockItem()
+        dockgroup = DockGroup()
+        dockgroup.connect('item-added', on_item_added)
+        dockgroup.insert_item(dockitem1)
+        item_nums = dockgroup.insert_items([dockitem2, dockitem3], 0)
+
+        self.assertEquals([0, 1], item_nums)
+        self.assertEquals([dockitem1, dockitem2, dockitem3], added_events)
+        self.assertTrue(dockgroup.get_nth_item(0) is dockitem2)
+        self.assertTrue(dockgroup.get_nth_item(1) is dockitem3)
+        self.assertTrue(dockgroup.get_nth_item(2) is dockitem1)
+        self.assertEquals(2, dockgroup.item_num(dockitem1))
+        self.assertEquals(1, dockgroup.get_current_item())
+
+        dockitem1.destroy()
+        dockitem2.destroy()
+        dockitem3.destroy()
+        dockgroup.destroy()
+
+    def test_tab_metrics_cache(self):
+        dockitem = DockItem(title='t')
+        dockgroup = DockGroup()
+        dockgroup.add(dockitem)
+        tab = dockgroup._tabs[0]
+
+        dockgroup.size_request()
+        metrics = tab.metrics
+        self.assertTrue(metrics is not None)
+
+        dockgroup.size_request()
+        self.assertTrue(tab.metrics is metrics)
+
+        dockitem.set_title('a much longer title')
+        self.assertTrue(tab.metrics is None)
+        dockgroup.size_request()
+        self.assertTrue(tab.metrics[0] > metrics[0])
+
+        dockitem.set_icon_name('gtk-new')
+        self.assertTrue(tab.metrics is None)
+        dockgroup.size_request()
+
+        dockgroup.set_style(gtk.Style())
+        self.assertTrue(tab.metrics is None)
+
+        dockitem.destroy()
+        dockgroup.destroy()
+
+    def test_visible_tabs_mru(self):
+        dockitem1 = DockItem()
+        dockitem2 = DockItem()
+        dockitem3 = DockItem()
+        dockgroup = DockGroup()
+        dockgroup.add(dockitem1)
+        dockgroup.add(dockitem2)
+        dockgroup.add(dockitem3)
+        dockgroup.set_current_item(0)
+
+        for tab in dockgroup._tabs:
+            tab.area.width = 10
+
+        dockgroup._available_width = 25
+        dockgroup._update_visible_tabs()
+        self.assertEquals([dockitem1, dockitem3], dockgroup.visible_items)
+
+        dockgroup.set_current_item(1)
+        dockgroup._update_visible_tabs()
+        self.assertEquals([dockitem1, dockitem2], dockgroup.visible_items)
+
+        dockgroup._available_width = 5
+        dockgroup._update_visible_tabs()
+        self.assertEquals([dockitem2], dockgroup.visible_items)
+
+        dockgroup._available_width = 100
+        dockgroup._update_visible_tabs()
+        self.assertEquals([dockitem2, dockitem1, dockitem3], dockgroup.visible_items)
+
+        dockitem1.destroy()
+        dockitem2.destroy()
+        dockitem3.destroy()
+        dockgroup.destroy()
+
+    def test_lazy_tab_widgets(self):
+        dockitem1 = DockItem(title='item 1')
+        dockitem2 = DockItem(title='item 2')
+        dockgroup = DockGroup()
+        dockgroup.set_tab_widget_timeout(0)
+        dockgroup.add(dockitem1)
+        dockgroup.add(dockitem2)
+        tab1, tab2 = dockgroup._tabs
+
+        self.assertTrue(tab1.image is None)
+        self.assertTrue(tab2.image is None)
+
+        dockgroup.size_request()
+        dockgroup.size_allocate(gtk.gdk.Rectangle(0, 0, 400, 100))
+        self.assertTrue(tab1.label is not None)
+        self.assertTrue(tab2.label is not None)
+
+        # Estimated metrics are corrected within the same allocation
+        self.assertEquals(dockgroup._measure_tab(tab1), tab1.metrics)
+        self.assertEquals(tab1.metrics[0], tab1.area.width)
+
+        dockgroup.size_allocate(gtk.gdk.Rectangle(0, 0, 1, 100))
+        self.assertEquals([dockitem2], dockgroup.visible_items)
+        self.assertTrue(tab1.hidden_since is not None)
+
+        dockgroup._on_tab_widget_timeout()
+        self.assertTrue(tab1.image is None)
+        self.assertTrue(tab2.image is not None)
+
+        dockitem1.destroy()
+        dockitem2.destroy()
+        dockgroup.destroy()
+
+    def test_tab_widget_sweep_is_removed_on_destroy(self):
+        dockitem1 = DockItem(title='item 1')
+        dockitem2 = DockItem(title='item 2')
+        dockgroup = DockGroup()
+        dockgroup.add(dockitem1)
+        dockgroup.add(dockitem2)
+
+        dockgroup.size_request()
+        dockgroup.size_allocate(gtk.gdk.Rectangle(0, 0, 400, 100))
+        dockgroup.size_allocate(gtk.gdk.Rectangle(0, 0, 1, 100))
+        self.assertTrue(dockgroup._tab_widget_source is not None)
+
+        dockgroup.destroy()
+        self.assertTrue(dockgroup._tab_widget_source is None)
+
+        dockitem1.destroy()
+        dockitem2.destroy()
+
+    def test_item_num_insert_past_end(self):
+        dockitems = [DockItem() for i in range(3)]
+        dockgroup = DockGroup()
+        dockgroup.insert_item(dockitems[0], 5)
+        dockgroup.insert_items(dockitems[1:], 5)
+
+        for index, dockitem in enumerate(dockitems):
+            self.assertEquals(index, dockgroup.item_num(dockitem))
+
+        self.assertEquals(2, dockgroup.get_current_item())
+
+        for dockitem in dockitems:
+            dockitem.destroy()
+
+        dockgroup.destroy()
+
+    def test_list_menu(self):
+        dockitem1 = DockItem(title='item 1')
+        dockitem2 = DockItem(title='item 2')
+        dockgroup = DockGroup()
+        dockgroup.add(dockitem1)
+        dockgroup.add(dockitem2)
+        self.assertEquals([], dockgroup._list_menu.get_children())
+
+        dockgroup._update_list_menu()
+        menu_items = dockgroup._list_menu.get_children()
+        self.assertEquals(['item 1', 'item 2'], [m.get_label() for m in menu_items])
+
+        dockgroup.remove(dockitem1)
+        self.assertEquals(menu_items, dockgroup._list_menu.get_children())
+        self.assertFalse(dockgroup._list_menu_valid)
+
+        dockgroup._update_list_menu()
+        self.assertEquals(['item 2'], [m.get_label() for m in dockgroup._list_menu.get_children()])
+
+        dockitem1.destroy()
+        dockitem2.destroy()
+        dockgroup.destroy()
+
+    def test_tab_strip_cache(self):
+        dockitem1 = DockItem(title='item 1')
+        dockitem2 = DockItem(title='item 2')
+        dockgroup = DockGroup()
+        dockgroup.add(dockitem1)
+        dockgroup.add(dockitem2)
+
+        window = gtk.Window()
+        window.add(dockgroup)
+        window.set_size_request(200, 200)
+        window.show_all()
+
+        while gtk.events_pending():
+            gtk.main_iteration()
+
+        tab_strip = dockgroup._tab_strip
+        self.assertTrue(tab_strip is not None)
+
+        dockgroup.queue_draw()
+        while gtk.events_pending():
+            gtk.main_iteration()
+
+        self.assertTrue(dockgroup._tab_strip is tab_strip)
+
+        # Only the decoration area is cached, vertical resizes keep it
+        window.set_size_request(200, 300)
+        while gtk.events_pending():
+            gtk.main_iteration()
+
+        self.assertEquals(300, dockgroup.allocation.height)
+        self.assertTrue(dockgroup._tab_strip is tab_strip)
+
+        dockgroup.set_current_item(0)
+        while gtk.events_pending():
+            gtk.main_iteration()
+
+        self.assertTrue(dockgroup._tab_strip is not tab_strip)
+
+        window.destroy()
+
+    def test_hover_tab(self):
+        dockitem1 = DockItem(title='item 1', title_tooltip_text='tooltip 1')
+        dockitem2 = DockItem(title='item 2', title_tooltip_text='tooltip 2')
+        dockgroup = DockGroup()
+        dockgroup.add(dockitem1)
+        dockgroup.add(dockitem2)
+        dockgroup.size_request()
+        dockgroup.size_allocate(gtk.gdk.Rectangle(0, 0, 400, 100))
+        tab1, tab2 = dockgroup._tabs
+
+        self.assertFalse(tab1.button.flags() & gtk.VISIBLE)
+        self.assertTrue(tab2.button.flags() & gtk.VISIBLE)
+
+        dockgroup._set_hover_tab(tab1)
+        self.assertTrue(tab1.button.flags() & gtk.VISIBLE)
+        self.assertEquals('tooltip 1', dockgroup.get_tooltip_text())
+
+        dockgroup._set_hover_tab(tab2)
+        self.assertFalse(tab1.button.flags() & gtk.VISIBLE)
+        self.assertTrue(tab2.button.flags() & gtk.VISIBLE)
+        self.assertEquals('tooltip 2', dockgroup.get_tooltip_text())
+
+        dockgroup._set_hover_tab(None)
+        self.assertTrue(tab2.button.flags() & gtk.VISIBLE)
+        self.assertEquals(None, dockgroup.get_tooltip_text())
+
+        dockitem1.destroy()
+        dockitem2.destroy()
+        dockgroup.destroy()
+
     def test_remove_item(self):
         dockitem1 = DockItem()
         dockitem2 = DockItem()
@@ -191,6 +441,36 @@ class TestDockGroup(unittest.TestCase):
         dockitem2.destroy()
         dockgroup.destroy()
 
+    def test_remove_items(self):
+        removed_events = []
+
+        def on_item_removed(dockgroup, item):
+            self.assertTrue(item not in dockgroup)
+            removed_events.append(item)
+
+        dockitems = [DockItem() for i in range(4)]
+        dockgroup = DockGroup()
+        dockgroup.connect('item-removed', on_item_removed)
+
+        for dockitem in dockitems:
+            dockgroup.add(dockitem)
+
+        dockgroup.set_current_item(0)
+        dockgroup.remove_items([dockitems[2], dockitems[1]])
+        self.assertEquals([dockitems[2], dockitems[1]], removed_events)
+        self.assertEquals([dockitems[0], dockitems[3]], dockgroup.items)
+        self.assertEquals(1, dockgroup.item_num(dockitems[3]))
+        self.assertEquals(0, dockgroup.get_current_item())
+
+        dockgroup.remove_items([dockitems[0]])
+        self.assertEquals(0, dockgroup.get_current_item())
+        self.assertTrue(dockgroup.get_nth_item(0) is dockitems[3])
+
+        for dockitem in dockitems:
+            dockitem.destroy()
+
+        dockgroup.destroy()
+
     def test_item_num(self):
         dockitem1 = DockItem()
         dockitem2 = DockItem()
@@ -203,6 +483,29 @@ class TestDockGroup(unittest.TestCase):
         dockitem1.destroy()
         dockgroup.destroy()
 
+    def test_item_num_insert_remove(self):
+        dockitems = [DockItem() for i in range(5)]
+        dockgroup = DockGroup()
+
+        for dockitem in dockitems:
+            dockgroup.add(dockitem)
+
+        dockgroup.remove(dockitems[1])
+        dockgroup.insert_item(dockitems[1], 3)
+        dockgroup.reorder_item(dockitems[4], 0)
+
+        for index, dockitem in enumerate(dockgroup.items):
+            self.assertEquals(index, dockgroup.item_num(dockitem))
+
+        self.assertEquals(3, dockgroup.item_num(dockitems[3]))
+        self.assertEquals(4, dockgroup.get_current_item())
+
+        for dockitem in dockitems:
+            dockitem.destroy()
+
+        self.assertEquals(None, dockgroup.get_current_item())
+        dockgroup.destroy()
+
     def test_get_n_items(self):
         dockgroup = DockGroup()
         self.assertTrue(dockgroup.get_n_items() == len(dockgroup) == 0)
@@ -269,6 +572,95 @@ class TestDockGroup(unittest.TestCase):
         dockitem2.destroy()
         dockgroup.destroy()
 
+    def test_switch_tab(self):
+        dockitem1 = DockItem(title='item 1')
+        dockitem2 = DockItem(title='item 2')
+        dockitem1.show()
+        dockitem2.show()
+        dockgroup = DockGroup()
+        dockgroup.add(dockitem1)
+        dockgroup.add(dockitem2)
+        dockgroup.size_request()
+        dockgroup.size_allocate(gtk.gdk.Rectangle(0, 0, 400, 100))
+        self.assertFalse(dockitem1.get_child_visible())
+        self.assertTrue(dockitem2.get_child_visible())
+
+        # Both tabs are visible, switching should not need a size allocation
+        allocation = tuple(dockitem2.allocation)
+        dockgroup.set_current_item(0)
+        self.assertTrue(dockitem1.get_child_visible())
+        self.assertFalse(dockitem2.get_child_visible())
+        self.assertEquals(allocation, tuple(dockitem1.allocation))
+
+        # Only the tabs that changed relative to the current tab are redrawn
+        tab1, tab2 = dockgroup._tabs
+        self.assertEquals(0, dockgroup._drawn_tabs[tab1][4])
+        self.assertEquals(1, dockgroup._drawn_tabs[tab2][4])
+
+        dockitem1.destroy()
+        dockitem2.destroy()
+        dockgroup.destroy()
+
+    def test_remove_visible_tab(self):
+        dockitems = [DockItem(title='item %d' % i) for i in range(4)]
+        dockgroup = DockGroup()
+
+        for dockitem in dockitems:
+            dockitem.show()
+            dockgroup.add(dockitem)
+
+        dockgroup.set_current_item(1)
+        dockgroup.size_request()
+        dockgroup.size_allocate(gtk.gdk.Rectangle(0, 0, 600, 100))
+        removed_tab = dockgroup._tab_map[dockitems[2]]
+        self.assertTrue(removed_tab in dockgroup._visible_tabs)
+
+        # Removing a visible tab is a structural change, never a plain switch
+        resizes = []
+        dockgroup.queue_resize = lambda: resizes.append(True)
+        dockgroup.remove(dockitems[2])
+        del dockgroup.queue_resize
+        self.assertTrue(resizes)
+        self.assertTrue(removed_tab not in dockgroup._visible_tabs)
+        self.assertTrue(removed_tab not in dockgroup._drawn_tabs)
+
+        dockgroup.size_request()
+        dockgroup.size_allocate(gtk.gdk.Rectangle(0, 0, 600, 100))
+        self.assertEquals([dockitems[0], dockitems[1], dockitems[3]],
+                          sorted(dockgroup.visible_items, key=dockgroup.item_num))
+
+        for dockitem in dockitems:
+            dockitem.destroy()
+
+        dockgroup.destroy()
+
+    def test_focus_current_item_only(self):
+        buttons = [gtk.Button('button %d' % i) for i in range(2)]
+        dockitems = [DockItem(title='item %d' % i) for i in range(2)]
+        dockgroup = DockGroup()
+
+        for button, dockitem in zip(buttons, dockitems):
+            dockitem.add(button)
+            dockgroup.add(dockitem)
+
+        window = gtk.Window()
+        window.add(dockgroup)
+        window.set_size_request(400, 200)
+        window.show_all()
+
+        while gtk.events_pending():
+            gtk.main_iteration()
+
+        # The first item is shown but not child-visible
+        dockgroup.set_current_item(1)
+        window.child_focus(gtk.DIR_TAB_FORWARD)
+        self.assertTrue(window.get_focus() is buttons[1])
+
+        window.child_focus(gtk.DIR_TAB_FORWARD)
+        self.assertTrue(window.get_focus() is not buttons[0])
+
+        window.destroy()
+
     def test_next_item(self):
         dockitem1 = DockItem()
         dockitem2 = DockItem()
@@ -374,6 +766,9 @@ class TestDockGroup(unittest.TestCase):
         dockgroup = DockGroup()
         dockgroup.add(dockitem)
 
+        # Tab widgets are created when the tab is allocated
+        dockgroup.size_request()
+        dockgroup.size_allocate(gtk.gdk.Rectangle(0, 0, 200, 100))
         tab = dockgroup._tabs[0]
 
         item_closed = []
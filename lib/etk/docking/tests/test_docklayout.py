@@ -47,7 +47,7 @@ class TestDockLayout(unittest.TestCase):
         assert frame in layout.frames
         print layout._signal_handlers
         self.assertEquals(4, len(layout._signal_handlers))
-        self.assertEquals(9, len(layout._signal_handlers[frame]))
+        self.assertEquals(10, len(layout._signal_handlers[frame]))
 
         layout.remove(frame)
 
@@ -72,7 +72,7 @@ class TestDockLayout(unittest.TestCase):
 
         assert frame in layout.frames
         self.assertEquals(4, len(layout._signal_handlers))
-        self.assertEquals(9, len(layout._signal_handlers[frame]))
+        self.assertEquals(10, len(layout._signal_handlers[frame]))
 
         paned.remove(group)
 
@@ -83,6 +83,40 @@ class TestDockLayout(unittest.TestCase):
         assert item not in layout._signal_handlers.keys(), layout._signal_handlers
         assert frame in layout.frames
 
+    def test_content_is_not_connected(self):
+        win = gtk.Window(gtk.WINDOW_TOPLEVEL)
+        frame = DockFrame()
+        paned = DockPaned()
+        group = DockGroup()
+        item1 = DockItem()
+        item2 = DockItem()
+        entry = gtk.Entry()
+        box = gtk.VBox()
+        box.add(entry)
+
+        win.add(frame)
+        frame.add(paned)
+        paned.add(group)
+        group.add(item1)
+        group.add(item2)
+        item1.add(box)
+
+        layout = DockLayout()
+        layout.add(frame)
+
+        self.assertEquals(5, len(layout._signal_handlers))
+        assert box not in layout._signal_handlers
+        assert entry not in layout._signal_handlers
+        self.assertEquals([win], layout._toplevels.keys())
+
+        selected = []
+        layout.connect('item-selected', lambda layout, group, item: selected.append(item))
+        win.set_focus(entry)
+        self.assertEquals([item1], selected)
+
+        layout.remove(frame)
+        assert not layout._toplevels, layout._toplevels
+
     def test_get_widgets(self):
         win = gtk.Window(gtk.WINDOW_TOPLEVEL)
         frame = DockFrame()
@@ -115,6 +149,17 @@ class TestDockLayout(unittest.TestCase):
         assert widgets[0] is group
         assert widgets[1] is group2
 
+        group2.set_name('bar')
+        self.assertEquals([group], layout.get_widgets('EtkDockGroup'))
+        self.assertEquals([group2], layout.get_widgets('bar'))
+
+        paned.remove(group2)
+        self.assertEquals([], layout.get_widgets('bar'))
+
+        # Named content of dock items is found as well
+        label.set_name('baz')
+        self.assertEquals([label], layout.get_widgets('baz'))
+
     def test_get_widgets_with_many_frames(self):
         frame1 = DockFrame()
         frame2 = DockFrame()
@@ -232,6 +277,96 @@ class TestDockLayoutDnD(unittest.TestCase):
         assert layout._drag_data
         assert layout._drag_data.drop_widget is paned, '%s != %s' % (layout._drag_data.drop_widget, paned)
 
+    def test_placeholder_is_reused(self):
+        win = gtk.Window(gtk.WINDOW_TOPLEVEL)
+        frame = DockFrame()
+        paned = DockPaned()
+        group = DockGroup()
+        item = DockItem()
+
+        layout = self.layout
+
+        layout.add(frame)
+
+        win.add(frame)
+        frame.add(paned)
+        paned.add(group)
+        group.add(item)
+
+        win.set_default_size(200, 200)
+        win.show_all()
+
+        while gtk.events_pending():
+            gtk.main_iteration()
+
+        context = StubContext(group, [group.items[0]])
+
+        layout.on_widget_drag_motion(frame, context, 2, 100, 0)
+        assert layout._drag_data.drop_widget is frame
+        placeholder = frame._placeholder
+        assert placeholder
+        assert placeholder.get_child_visible()
+        allocation = frame._placeholder_allocation
+
+        # Moving along the same border does not touch the placeholder
+        layout.on_widget_drag_motion(frame, context, 2, 120, 0)
+        assert frame._placeholder is placeholder
+        assert frame._placeholder_allocation is allocation
+
+        # Another border moves the same placeholder
+        layout.on_widget_drag_motion(frame, context, 100, 2, 0)
+        assert frame._placeholder is placeholder
+        assert frame._placeholder_allocation != allocation
+
+        layout.on_widget_drag_leave(frame, context, 0)
+        assert frame._placeholder is placeholder
+        assert not placeholder.get_child_visible()
+
+    def test_placeholder_is_released_on_reparent(self):
+        win = gtk.Window(gtk.WINDOW_TOPLEVEL)
+        frame = DockFrame()
+        paned = DockPaned()
+        group = DockGroup()
+        item = DockItem()
+
+        layout = self.layout
+
+        layout.add(frame)
+
+        win.add(frame)
+        frame.add(paned)
+        paned.add(group)
+        group.add(item)
+
+        win.set_default_size(200, 200)
+        win.show_all()
+
+        while gtk.events_pending():
+            gtk.main_iteration()
+
+        context = StubContext(group, [group.items[0]])
+
+        layout.on_widget_drag_motion(frame, context, 2, 100, 0)
+        layout.on_widget_drag_leave(frame, context, 0)
+        assert frame._placeholder
+
+        # Move the frame to another window, e.g. a floating one
+        other = gtk.Window(gtk.WINDOW_TOPLEVEL)
+        other.set_default_size(200, 200)
+        other.show()
+        frame.reparent(other)
+
+        while gtk.events_pending():
+            gtk.main_iteration()
+
+        assert frame._placeholder is None
+
+        layout.on_widget_drag_motion(frame, context, 2, 100, 0)
+        placeholder = frame._placeholder
+        assert placeholder
+        assert placeholder.flags() & gtk.REALIZED
+        assert placeholder.window.get_toplevel() is other.window
+
     def test_remove_paned_with_one_child(self):
         win = gtk.Window(gtk.WINDOW_TOPLEVEL)
         frame = DockFrame()
@@ -404,3 +539,20 @@ class PlacementTest(unittest.TestCase):
         assert paned.get_nth_item(1) is g2
         assert paned.get_nth_item(2) is g1
 
+    def test_placement_below_in_other_orientation(self):
+
+        g1, g2 = DockGroup(), DockGroup()
+
+        docklayout.add_new_group_right(self.group, g1)
+
+        # g1 is at index 1 of a horizontal paned, g2 goes into a new paned
+        docklayout.add_new_group_below(g1, g2)
+
+        paned = g2.get_parent()
+        assert isinstance(paned, DockPaned), paned
+        assert g1.get_parent() is paned
+        assert paned.item_num(g1) == 0
+        assert paned.item_num(g2) == 1
+
+        paned.remove(g2)
+        assert paned.item_num(g2) is None
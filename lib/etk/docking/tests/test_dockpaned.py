@@ -25,6 +25,7 @@ import gtk
 import gtk.gdk as gdk
 
 from etk.docking import DockPaned, DockGroup
+from etk.docking.dockpaned import fair_scale, scale_weights, apportion
 
 
 class TestDockPaned(unittest.TestCase):
@@ -97,6 +98,34 @@ class TestDockPaned(unittest.TestCase):
 
         dockpaned.destroy()
 
+    def test_prop_outline_resize(self):
+        global notify_called
+
+        def _on_notify(gobject, pspec):
+            global notify_called
+            notify_called = True
+
+        dockpaned = DockPaned()
+        dockpaned.connect('notify::outline-resize', _on_notify)
+
+        self.assertFalse(dockpaned.get_outline_resize())
+
+        notify_called = False
+        dockpaned.set_outline_resize(True)
+        self.assertTrue(dockpaned.get_outline_resize(),
+                        msg='get_outline_resize method did not return expected value')
+        self.assertTrue(notify_called,
+                        msg='outline-resize property change notification failed when using set_outline_resize method')
+
+        notify_called = False
+        dockpaned.props.outline_resize = False
+        self.assertFalse(dockpaned.props.outline_resize,
+                         msg='.props attribute did not return expected value')
+        self.assertTrue(notify_called,
+                        msg='outline-resize property change notification failed when using .props attribute')
+
+        dockpaned.destroy()
+
     ############################################################################
     # Test child properties
     ############################################################################
@@ -276,6 +305,192 @@ class TestDockPaned(unittest.TestCase):
         self.assertAlmostEquals(0.5, dockpaned._items[0].weight, 4)
         self.assertAlmostEquals(0.5, dockpaned._items[1].weight, 4)
 
+    def test_fair_scale(self):
+        self.assertEquals([], fair_scale(1.0, []))
+
+        weights = fair_scale(.5, ((.3, .2), (.5, .1)))
+        self.assertAlmostEquals(0.2, weights[0], 4)
+        self.assertAlmostEquals(0.3, weights[1], 4)
+
+        # Clamping the last pair lowers the factor for the first pair
+        weights = fair_scale(1.0, ((.6, .1), (.2, .1), (.2, .5)))
+        self.assertAlmostEquals(0.375, weights[0], 4)
+        self.assertAlmostEquals(0.125, weights[1], 4)
+        self.assertAlmostEquals(0.5, weights[2], 4)
+        self.assertAlmostEquals(1.0, sum(weights), 4)
+
+        # Not enough weight left: everything gets its min_weight
+        weights = fair_scale(.1, ((.5, .2), (.5, .0), (.0, .1)))
+        self.assertEquals([.2, .0, .1], weights)
+
+    def test_scale_weights(self):
+        # Enough weights to use numpy, if available
+        weights = [(i % 7) / 21. for i in range(100)]
+        min_weights = [(i % 3) / 300. for i in range(100)]
+        expected = fair_scale(1.0, zip(weights, min_weights))
+        scaled = scale_weights(1.0, weights, min_weights)
+
+        self.assertEquals(len(expected), len(scaled))
+        self.assertAlmostEquals(1.0, sum(scaled), 7)
+
+        for e, s in zip(expected, scaled):
+            self.assertAlmostEquals(e, s, 9)
+
+    def test_apportion(self):
+        self.assertEquals([], apportion(100, []))
+        self.assertEquals([5, 3, 2], apportion(10, [.5, .25, .25]))
+        self.assertEquals([34, 33, 33], apportion(100, [1., 1., 1.]))
+        self.assertEquals([0, 0], apportion(-4, [.5, .5]))
+
+    def test_allocation_no_drift(self):
+        dockpaned = DockPaned()
+        dockgroups = [DockGroup() for i in range(7)]
+
+        for dockgroup in dockgroups:
+            dockpaned.add(dockgroup)
+
+        dockpaned.size_request()
+        dockpaned.size_allocate(gdk.Rectangle(0, 0, 503, 100))
+        widths = [g.allocation.width for g in dockgroups]
+
+        self.assertEquals(503 - 6 * dockpaned.get_handle_size(), sum(widths))
+        self.assertAlmostEquals(1.0, sum(i.weight for i in dockpaned._items), 7)
+
+        for size in (1001, 757, 503):
+            dockpaned._invalidate_allocation()
+            dockpaned.size_allocate(gdk.Rectangle(0, 0, size, 100))
+
+        self.assertEquals(widths, [g.allocation.width for g in dockgroups])
+
+        for dockgroup in dockgroups:
+            dockgroup.destroy()
+
+        dockpaned.destroy()
+
+    def test_allocation_cache(self):
+        dockpaned = DockPaned()
+        dockgroup1 = DockGroup()
+        dockgroup2 = DockGroup()
+        dockpaned.add(dockgroup1)
+        dockpaned.add(dockgroup2)
+        dockpaned.size_request()
+
+        dockpaned.size_allocate(gdk.Rectangle(0, 0, 200, 100))
+        dockpaned.size_allocate(gdk.Rectangle(0, 0, 200, 100))
+        self.assertEquals((1, 1), dockpaned.get_allocation_cache_stats())
+        self.assertEquals(dockgroup1.allocation.width + dockgroup2.allocation.width,
+                          200 - dockpaned.get_handle_size())
+
+        dockpaned.size_allocate(gdk.Rectangle(0, 0, 300, 100))
+        self.assertEquals((1, 2), dockpaned.get_allocation_cache_stats())
+
+        dockpaned.reorder_item(dockgroup2, 0)
+        dockpaned.size_allocate(gdk.Rectangle(0, 0, 300, 100))
+        self.assertEquals((1, 3), dockpaned.get_allocation_cache_stats())
+        self.assertEquals(0, dockgroup2.allocation.x)
+
+        dockgroup2.destroy()
+        dockgroup1.destroy()
+        dockpaned.destroy()
+
+    def test_skip_unchanged_allocation(self):
+        allocated = []
+
+        def on_size_allocate(widget, allocation):
+            allocated.append(widget)
+
+        dockpaned = DockPaned()
+        dockgroups = [DockGroup() for i in range(3)]
+
+        for dockgroup in dockgroups:
+            dockpaned.add(dockgroup)
+            dockgroup.connect('size-allocate', on_size_allocate)
+
+        dockpaned.size_request()
+        dockpaned.size_allocate(gdk.Rectangle(0, 0, 300, 100))
+        self.assertEquals(3, len(allocated))
+
+        # Nothing changed
+        del allocated[:]
+        dockpaned.size_allocate(gdk.Rectangle(0, 0, 300, 100))
+        self.assertEquals([], allocated)
+
+        # A child requesting a new size is allocated again
+        dockgroups[0].queue_resize()
+        dockpaned.size_request()
+        dockpaned.size_allocate(gdk.Rectangle(0, 0, 300, 100))
+        self.assertEquals([dockgroups[0]], allocated)
+
+        # Moving the last handle leaves the first item alone
+        del allocated[:]
+        dockpaned._dragcontext.dragging = True
+        dockpaned._dragcontext.dragged_object = dockpaned._handles[1]
+        dockpaned._dragcontext.offset_x = 0
+        dockpaned._drag_handle(dockpaned._handles[1].area.x - 10, 50)
+        dockpaned.size_allocate(gdk.Rectangle(0, 0, 300, 100))
+        self.assertTrue(dockgroups[0] not in allocated)
+        self.assertTrue(dockgroups[1] in allocated)
+        self.assertTrue(dockgroups[2] in allocated)
+
+        for dockgroup in dockgroups:
+            dockgroup.destroy()
+
+        dockpaned.destroy()
+
+    def test_get_handle_at_pos(self):
+        dockpaned = DockPaned()
+        dockgroups = [DockGroup() for i in range(4)]
+
+        for dockgroup in dockgroups:
+            dockpaned.add(dockgroup)
+
+        dockpaned.size_request()
+        dockpaned.size_allocate(gdk.Rectangle(0, 0, 400, 100))
+
+        for index, handle in enumerate(dockpaned._handles):
+            a = handle.area
+            self.assertTrue(dockpaned._get_handle_at_pos(a.x, a.y + 1) is handle)
+            self.assertTrue(dockpaned._get_handle_at_pos(a.x + a.width, 50) is handle)
+            self.assertEquals(index, dockpaned._get_handle_index_at_pos(a.x + 1, 50))
+
+        a = dockgroups[1].allocation
+        self.assertTrue(dockpaned._get_handle_at_pos(a.x + a.width / 2, 50) is None)
+        self.assertTrue(dockpaned._get_handle_at_pos(399, 50) is None)
+
+        for dockgroup in dockgroups:
+            dockgroup.destroy()
+
+        dockpaned.destroy()
+
+    def test_drag_handle(self):
+        dockgroup1 = DockGroup()
+        dockgroup2 = DockGroup()
+        dockpaned = DockPaned()
+        dockpaned.add(dockgroup1)
+        dockpaned.add(dockgroup2)
+        dockpaned.size_request()
+        dockpaned.size_allocate(gdk.Rectangle(0, 0, 400, 100))
+
+        handle = dockpaned._handles[0]
+        width1 = dockgroup1.allocation.width
+        dockpaned._dragcontext.dragging = True
+        dockpaned._dragcontext.dragged_object = handle
+        dockpaned._dragcontext.offset_x = 0
+        dockpaned._dragcontext.offset_y = 0
+
+        # Only the latest pointer position is applied
+        dockpaned._drag_position = (handle.area.x + 10, 50)
+        dockpaned._drag_position = (handle.area.x + 20, 50)
+        dockpaned._flush_drag_handle()
+        dockpaned.size_allocate(gdk.Rectangle(0, 0, 400, 100))
+
+        self.assertTrue(abs(width1 + 20 - dockgroup1.allocation.width) <= 1)
+        self.assertTrue(dockpaned._drag_position is None)
+
+        dockgroup2.destroy()
+        dockgroup1.destroy()
+        dockpaned.destroy()
+
 
     ############################################################################
     # Test public api
@@ -371,6 +586,35 @@ class TestDockPaned(unittest.TestCase):
         dockgroup1.destroy()
         dockpaned.destroy()
 
+    def test_insert_items(self):
+        added_events = []
+
+        def on_item_added(dockpaned, child):
+            self.assertEquals(3, len(dockpaned))
+            added_events.append(child)
+
+        dockgroup1 = DockGroup()
+        dockgroup2 = DockGroup()
+        dockgroup3 = DockGroup()
+        dockpaned = DockPaned()
+        dockpaned.add(dockgroup1)
+        dockpaned.connect('item-added', on_item_added)
+        item_nums = dockpaned.insert_items([dockgroup2, dockgroup3], 0, [0.2, 0.3])
+
+        self.assertEquals([0, 1], item_nums)
+        self.assertEquals([dockgroup2, dockgroup3], added_events)
+        self.assertTrue(dockpaned.get_nth_item(0) is dockgroup2)
+        self.assertTrue(dockpaned.get_nth_item(1) is dockgroup3)
+        self.assertTrue(dockpaned.get_nth_item(2) is dockgroup1)
+        self.assertEquals(2, dockpaned.item_num(dockgroup1))
+        self.assertEquals(2, dockpaned._get_n_handles())
+        self.assertAlmostEquals(0.3, dockpaned.child_get_property(dockgroup3, 'weight'), 4)
+
+        dockgroup3.destroy()
+        dockgroup2.destroy()
+        dockgroup1.destroy()
+        dockpaned.destroy()
+
     def test_remove_item(self):
         dockgroup1 = DockGroup()
         dockgroup2 = DockGroup()
@@ -404,6 +648,51 @@ class TestDockPaned(unittest.TestCase):
         dockgroup1.destroy()
         dockpaned.destroy()
 
+    def test_item_num_insert_remove(self):
+        dockgroup1 = DockGroup()
+        dockgroup2 = DockGroup()
+        dockgroup3 = DockGroup()
+        dockpaned = DockPaned()
+        dockpaned.add(dockgroup1)
+        dockpaned.add(dockgroup2)
+        dockpaned.insert_item(dockgroup3, position=0)
+
+        self.assertTrue(dockpaned.item_num(dockgroup3) == 0)
+        self.assertTrue(dockpaned.item_num(dockgroup1) == 1)
+        self.assertTrue(dockpaned.item_num(dockgroup2) == 2)
+
+        dockpaned.remove(dockgroup1)
+
+        self.assertTrue(dockpaned.item_num(dockgroup1) is None)
+        self.assertTrue(dockpaned.item_num(dockgroup2) == 1)
+        self.assertTrue(dockgroup1 not in dockpaned)
+        self.assertTrue(dockpaned._item_for_child(dockgroup2) is dockpaned._items[1])
+
+        dockgroup3.destroy()
+        dockgroup2.destroy()
+        dockgroup1.destroy()
+        dockpaned.destroy()
+
+    def test_item_num_insert_past_end(self):
+        dockgroup1 = DockGroup()
+        dockgroup2 = DockGroup()
+        dockgroup3 = DockGroup()
+        dockpaned = DockPaned()
+        dockpaned.insert_item(dockgroup1, position=5)
+        dockpaned.insert_items([dockgroup2, dockgroup3], position=5)
+
+        self.assertTrue(dockpaned.item_num(dockgroup1) == 0)
+        self.assertTrue(dockpaned.item_num(dockgroup2) == 1)
+        self.assertTrue(dockpaned.item_num(dockgroup3) == 2)
+
+        dockpaned.remove(dockgroup1)
+        self.assertTrue(dockpaned.item_num(dockgroup2) == 0)
+
+        dockgroup3.destroy()
+        dockgroup2.destroy()
+        dockgroup1.destroy()
+        dockpaned.destroy()
+
     def test_len(self):
         dockgroup1 = DockGroup()
         dockgroup2 = DockGroup()
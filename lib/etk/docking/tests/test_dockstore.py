@@ -33,6 +33,22 @@ class LoadingTestCase(unittest.TestCase):
         '<dockitem icon_name="icon" title="t" tooltip="xx" />'\
         '</dockgroup></dockpaned></dockframe></layout>' == s, s
 
+    def test_serialize_outline_resize(self):
+        layout = DockLayout()
+        frame = DockFrame()
+        layout.add(frame)
+        paned = DockPaned()
+        paned.set_outline_resize(True)
+        frame.add(paned)
+        paned.add(DockGroup())
+
+        s = serialize(layout)
+        assert 'outline_resize="true"' in s, s
+
+        layout = deserialize(s, ItemFactory())
+        paned = iter(layout.frames).next().child
+        assert paned.get_outline_resize()
+
     def test_deserialize(self):
         xml = '''
         <layout>
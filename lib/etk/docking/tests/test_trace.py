@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+# vim:sw=4:et:ai
+
+import json
+import unittest
+from StringIO import StringIO
+
+from etk.docking import trace
+
+class TestTrace(unittest.TestCase):
+
+    def test_disabled(self):
+        calls = []
+
+        @trace.traced('func')
+        def func(a):
+            calls.append(a)
+            return a
+
+        assert not trace.is_enabled()
+        assert func(1) == 1
+        assert calls == [1]
+        trace.trace('point', arg=object())
+
+    def test_events(self):
+        stream = StringIO()
+        trace.enable(stream)
+
+        @trace.traced('func')
+        def func(a, b):
+            trace.trace('point', a=a, obj=b)
+            return a
+
+        try:
+            assert func(1, None) == 1
+        finally:
+            trace.disable()
+
+        func(2, None)
+
+        events = json.loads(stream.getvalue())
+        assert [(e['name'], e['ph']) for e in events] == [('point', 'i'), ('func', 'X')]
+        assert events[0]['args'] == {'a': 1, 'obj': None}
+        assert events[1]['args'] == {'arg0': 1, 'arg1': None}
+        assert events[1]['dur'] >= 0
+        assert events[1]['ts'] <= events[0]['ts']
+
+    def test_no_events(self):
+        stream = StringIO()
+        trace.enable(stream)
+        trace.disable()
+
+        assert json.loads(stream.getvalue()) == []
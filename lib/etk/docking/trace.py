@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+# vim:sw=4:et:ai
+
+# Copyright © 2010 etk.docking Contributors
+#
+# This file is part of etk.docking.
+#
+# etk.docking is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# etk.docking is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with etk.docking. If not, see <http://www.gnu.org/licenses/>.
+
+
+'''
+Lightweight tracing for etk.docking.
+
+Trace points are named after the code they instrument. As long as tracing is
+disabled (the default) a trace point only checks a module global, arguments
+are not formatted. Once enabled with enable(), trace points write events to
+the given stream as a JSON array in the Trace Event Format, which can be
+loaded by chrome://tracing and Perfetto:
+
+ * traced functions produce complete events (``"ph": "X"``) with a start
+   time (``ts``) and duration (``dur``) in microseconds.
+ * trace() produces instant events (``"ph": "i"``).
+
+Event arguments are only converted to JSON (using repr() for anything that is
+not a number, string, boolean or None) when the event is written. The
+arguments themselves are evaluated by the caller, guard trace() calls with
+is_enabled() where building them costs something.
+'''
+
+from __future__ import absolute_import
+import json
+import os
+from functools import wraps
+from thread import get_ident
+from time import time
+
+
+_stream = None
+_separator = ''
+
+def enable(stream):
+    '''
+    :param stream: a file-like object trace events are written to.
+
+    Start writing trace events to stream, as the elements of a JSON array.
+    '''
+    global _stream, _separator
+    disable()
+    stream.write('[')
+    _stream = stream
+    _separator = '\n'
+
+def disable():
+    '''
+    Stop writing trace events and close the JSON array.
+    '''
+    global _stream
+    if _stream is not None:
+        _stream.write('\n]\n')
+        _stream = None
+
+def is_enabled():
+    '''
+    :returns: True if trace events are being written.
+    '''
+    return _stream is not None
+
+def _arg(value):
+    if value is None or isinstance(value, (bool, int, long, float, basestring)):
+        return value
+    return repr(value)
+
+def _emit(name, phase, ts, args, **fields):
+    event = dict(name=name, ph=phase, ts=ts, pid=os.getpid(), tid=get_ident(),
+                 args=dict((k, _arg(v)) for k, v in args.iteritems()), **fields)
+    global _separator
+    _stream.write(_separator + json.dumps(event))
+    _separator = ',\n'
+
+def trace(name, **args):
+    '''
+    :param name: name of the trace point
+    :param args: event arguments, only formatted when tracing is enabled
+
+    Emit an instant event.
+    '''
+    if _stream is not None:
+        _emit(name, 'i', time() * 1e6, args, s='t')
+
+def traced(name):
+    '''
+    :param name: name of the trace point
+
+    Decorator that emits a complete event, timing each call of the decorated
+    function. The positional arguments of the call are recorded as event
+    arguments.
+    '''
+    def decorator(func):
+        @wraps(func)
+        def traced_func(*args, **kwargs):
+            if _stream is None:
+                return func(*args, **kwargs)
+
+            start = time()
+
+            try:
+                return func(*args, **kwargs)
+            finally:
+                end = time()
+                _emit(name, 'X', start * 1e6, dict(('arg%d' % i, a) for i, a in enumerate(args)),
+                      dur=(end - start) * 1e6)
+        return traced_func
+    return decorator